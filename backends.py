@@ -0,0 +1,510 @@
+# ---------------- Хранилища накоплений ----------------
+# Итоги по месяцам и журнал пополнений живут в одном из хранилищ с общим
+# интерфейсом:
+#   connect()               — открыть/создать; ошибки доступа всплывают здесь
+#   load(month_keys)        — (data, synced), как storage.load_savings
+#                             (month_keys=None — все месяцы хранилища)
+#   save(data, synced, full) — записать дельту data − synced поверх того, что
+#                             сейчас в хранилище (параллельные сессии не
+#                             затирают друг друга), и вернуть новый снимок
+#                             synced; full=True — записать data как есть
+#   replace(data)           — записать data как есть (сброс) и вернуть
+#                             (synced, {месяц: ₽} до записи) — для сторно
+#   append_ledger(entries)  — дописать строки журнала (см. storage.ledger_entry)
+#
+# SheetsStore — Google Sheets (storage.py), SqliteStore и JsonStore —
+# локальные файлы: без сетевых вызовов, для быстрых развёртываний и
+# тестов. MirroredStore пишет в локальное хранилище сразу, а в таблицу —
+# фоновым StoreWriter'ом, так что Sheets остаётся зеркалом для просмотра.
+#
+# Выбор — переменными окружения (читаются в open_store):
+#   SAVINGS_BACKEND = sheets (по умолчанию) | sqlite | json
+#   SAVINGS_PATH    — файл локального хранилища
+#   SAVINGS_MIRROR  = 1 — зеркалировать локальное хранилище в таблицу
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+import streamlit as st
+
+from money import rub, to_minor
+from periods import normalize_months
+from storage import get_ledger, get_sheet, ledger_entry, load_savings, replace_savings, save_savings
+from tracing import traced
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATHS = {
+    "sqlite": os.path.join(HERE, "savings.sqlite3"),
+    "json": os.path.join(HERE, "savings_data.json"),
+}
+
+
+class SheetsStore:
+    """Google Sheets: первый лист — итоги, лист «Журнал» — пополнения."""
+
+    name = "Google Sheets"
+
+    def __init__(self, spreadsheet_id):
+        self.spreadsheet_id = spreadsheet_id
+
+    # хэндлы общие на процесс (st.cache_resource), открываются при первом обращении
+    @property
+    def sheet(self):
+        return get_sheet(self.spreadsheet_id)
+
+    @property
+    def ledger(self):
+        return get_ledger(self.spreadsheet_id)
+
+    def connect(self):
+        self.sheet
+        self.ledger
+
+    def load(self, month_keys):
+        return load_savings(self.sheet, month_keys)
+
+    def save(self, data, synced=None, full=False):
+        return save_savings(self.sheet, data, synced, full)
+
+    def replace(self, data):
+        return replace_savings(self.sheet, data)
+
+    def append_ledger(self, entries):
+        self.ledger.append_rows(entries, value_input_option='RAW')
+
+
+class SqliteStore:
+    """Локальная SQLite-база: каждая запись — одна транзакция."""
+
+    name = "SQLite"
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS savings (
+                month TEXT PRIMARY KEY,
+                pos   INTEGER NOT NULL,
+                rub   REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ledger (
+                ts TEXT, month TEXT, currency TEXT, amount REAL, rate REAL, rub REAL
+            );
+            """
+        )
+        return conn
+
+    def connect(self):
+        self._connect().close()
+
+    @traced("load_savings")
+    def load(self, month_keys):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT month, rub FROM savings ORDER BY pos").fetchall()
+        synced = normalize_months(rows)
+        data = {m: 0.0 for m in month_keys or ()}
+        data.update(synced)
+        return data, synced
+
+    @traced("save_savings")
+    def save(self, data, synced=None, full=False):
+        data = {m: round(float(v), 2) for m, v in data.items()}
+        with closing(self._connect()) as conn, conn:
+            if full or synced is None:
+                self._replace(conn, data)
+            else:
+                self._migrate(conn)
+                # rub = rub + дельта — в той же транзакции, что и чтение снимка
+                delta = _delta(data, synced)
+                rows = [(m, i, rub(d)) for i, (m, d) in enumerate(delta.items()) if d or m not in synced]
+                conn.executemany(
+                    "INSERT INTO savings (month, pos, rub) VALUES (?, ?, ?) "
+                    "ON CONFLICT(month) DO UPDATE SET rub = round(rub + excluded.rub, 2)",
+                    rows,
+                )
+                if any(m not in synced for m in data):
+                    conn.execute(
+                        "UPDATE savings SET pos = (SELECT COUNT(*) FROM savings AS s WHERE s.month < savings.month)"
+                    )
+            return dict(conn.execute("SELECT month, rub FROM savings ORDER BY pos").fetchall())
+
+    @traced("save_savings")
+    def replace(self, data):
+        data = {m: round(float(v), 2) for m, v in data.items()}
+        with closing(self._connect()) as conn, conn:
+            return dict(data), self._replace(conn, data)
+
+    @staticmethod
+    def _replace(conn, data):
+        """Итоги -> data в транзакции conn; возвращает то, что лежало до записи."""
+        previous = normalize_months(conn.execute("SELECT month, rub FROM savings ORDER BY pos").fetchall())
+        conn.execute("DELETE FROM savings")
+        conn.executemany(
+            "INSERT INTO savings (month, pos, rub) VALUES (?, ?, ?)",
+            [(m, i, v) for i, (m, v) in enumerate(data.items())],
+        )
+        return previous
+
+    @staticmethod
+    def _migrate(conn):
+        """Старые подписи месяцев -> ключи '2025-07' (повторы складываются), до применения дельты."""
+        rows = conn.execute("SELECT month, rub FROM savings ORDER BY pos").fetchall()
+        merged = normalize_months(rows)
+        if list(merged) != [m for m, _ in rows]:
+            conn.execute("DELETE FROM savings")
+            conn.executemany(
+                "INSERT INTO savings (month, pos, rub) VALUES (?, ?, ?)",
+                [(m, i, v) for i, (m, v) in enumerate(merged.items())],
+            )
+
+    def append_ledger(self, entries):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT INTO ledger VALUES (?, ?, ?, ?, ?, ?)", [tuple(e) for e in entries])
+
+
+class JsonStore:
+    """
+    Один JSON-файл {"savings": {месяц: ₽}, "ledger": [[...], ...]}.
+    Запись атомарная: новый файл рядом + fsync + os.replace, так что при
+    падении на диске остаётся либо старая, либо новая версия целиком.
+    """
+
+    name = "JSON"
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                doc = json.load(f)
+        except FileNotFoundError:
+            doc = {}
+        return {"savings": doc.get("savings", {}), "ledger": doc.get("ledger", [])}
+
+    def _write(self, doc):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def connect(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._write(self._read())
+
+    @traced("load_savings")
+    def load(self, month_keys):
+        with self._lock:
+            synced = normalize_months(self._read()["savings"].items())
+        data = {m: 0.0 for m in month_keys or ()}
+        data.update(synced)
+        return data, synced
+
+    @traced("save_savings")
+    def save(self, data, synced=None, full=False):
+        data = {m: round(float(v), 2) for m, v in data.items()}
+        with self._lock:
+            doc = self._read()
+            if full or synced is None:
+                doc["savings"] = data
+            else:
+                savings = normalize_months(doc["savings"].items())
+                for m, d in _delta(data, synced).items():
+                    if d or m not in savings:
+                        savings[m] = rub(int(to_minor([savings.get(m, 0.0)])[0]) + d)
+                doc["savings"] = dict(sorted(savings.items()))
+            self._write(doc)
+        return dict(doc["savings"])
+
+    @traced("save_savings")
+    def replace(self, data):
+        data = {m: round(float(v), 2) for m, v in data.items()}
+        with self._lock:
+            doc = self._read()
+            previous = normalize_months(doc["savings"].items())
+            doc["savings"] = data
+            self._write(doc)
+        return dict(data), previous
+
+    def append_ledger(self, entries):
+        with self._lock:
+            doc = self._read()
+            doc["ledger"].extend(list(e) for e in entries)
+            self._write(doc)
+
+
+class MirroredStore:
+    """
+    Локальное хранилище — источник правды, таблица — асинхронное зеркало.
+    Чтение и запись идут только в local; каждое сохранение ставится в
+    очередь фонового StoreWriter'а над remote. Первая запись зеркала —
+    полная перезапись листа (снимка таблицы у нас нет, и читать её не нужно).
+    """
+
+    def __init__(self, local, remote):
+        self.local = local
+        self.remote = remote
+        self.name = f"{local.name} → {remote.name}"
+        self.mirror = StoreWriter(remote)
+
+    def connect(self):
+        self.local.connect()
+
+    def load(self, month_keys):
+        return self.local.load(month_keys)
+
+    def save(self, data, synced=None, full=False):
+        synced = self.local.save(data, synced, full)
+        self.mirror.submit(synced, full=full)
+        return synced
+
+    def replace(self, data):
+        # сторно — по локальному хранилищу; зеркалу достаются сами строки журнала
+        synced, previous = self.local.replace(data)
+        self.mirror.submit(synced, full=True)
+        return synced, previous
+
+    def append_ledger(self, entries):
+        self.local.append_ledger(entries)
+        self.mirror.submit(None, entries)
+
+
+@st.cache_resource(show_spinner=False)
+def open_store(spreadsheet_id):
+    """Хранилище по настройкам окружения, одно на процесс; connect() уже вызван."""
+    backend = os.environ.get("SAVINGS_BACKEND", "sheets")
+    if backend == "sheets":
+        store = SheetsStore(spreadsheet_id)
+    elif backend in DEFAULT_PATHS:
+        path = os.environ.get("SAVINGS_PATH", DEFAULT_PATHS[backend])
+        store = SqliteStore(path) if backend == "sqlite" else JsonStore(path)
+        if os.environ.get("SAVINGS_MIRROR") == "1":
+            store = MirroredStore(store, SheetsStore(spreadsheet_id))
+    else:
+        raise ValueError(f"Неизвестное хранилище SAVINGS_BACKEND={backend!r}")
+    store.connect()
+    return store
+
+
+def _delta(data, synced):
+    """{месяц: копейки} — насколько data отличается от снимка synced (новые месяцы — целиком)."""
+    months = list(data)
+    delta = to_minor([data[m] for m in months]) - to_minor([synced.get(m, 0.0) for m in months])
+    return dict(zip(months, delta.tolist()))
+
+
+def _shifted(data, delta):
+    """data ({месяц: ₽}) плюс delta ({месяц: копейки})."""
+    shifted = dict(data)
+    for m, d in delta.items():
+        shifted[m] = rub(int(to_minor([shifted.get(m, 0.0)])[0]) + d)
+    return shifted
+
+
+def _reversals(previous, data):
+    """Сторно перезаписи: по строке журнала (₽) на каждый месяц, значение которого изменилось."""
+    months = list(previous) + [m for m in data if m not in previous]
+    delta = to_minor([data.get(m, 0.0) for m in months]) - to_minor([previous.get(m, 0.0) for m in months])
+    return [ledger_entry(m, "RUB", rub(d), 1.0) for m, d in zip(months, delta.tolist()) if d]
+
+
+class StoreWriter:
+    """
+    Отложенная запись (write-behind): submit() возвращается сразу, а фоновый
+    поток сливает накопленные изменения в хранилище одной пачкой — раз в
+    interval секунд или как только набралось max_pending отправок. Поток
+    живёт, только пока есть что писать: опустевший writer (сессия закрыта
+    или просто молчит) потока не держит, его запустит следующий submit().
+    Новые строки журнала уходят одним append_ledger, итоги — дельтой.
+
+    Если при записи хранилище влило изменения других сессий, новый снимок
+    отличается от отправленного: разница копится, пока сессия не заберёт
+    её через take_remote(), и добавляется к её отправкам — иначе следующая
+    дельта сессии «откатила» бы чужие пополнения. Чужие записи, сделанные,
+    пока сессия ничего не пишет, подтягивает pull().
+
+    Сброс (reset) пишется как есть, а сторно в журнал считается по тому,
+    что хранилище перезаписало в момент записи, — так журнал сходится с
+    итогами, даже если сессия не видела чужих пополнений.
+    """
+
+    def __init__(self, store, synced=None, interval=2.0, max_pending=10):
+        self.store = store
+        self.synced = synced
+        self.interval = interval
+        self.max_pending = max_pending
+        self.last_flush = None      # время последней успешной записи
+        self.last_error = None
+        self._data = None           # последнее состояние, ещё не записанное
+        self._entries = []          # строки журнала, ещё не дописанные
+        self._full = False
+        self._reset = False
+        self._pending = 0
+        self._remote = {}           # {месяц: копейки} чужих изменений, ещё не показанных сессии
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def pending(self):
+        """Сколько отправок ждут записи в хранилище."""
+        with self._cond:
+            return self._pending
+
+    def submit(self, data, entries=(), full=False):
+        # Храним только последнее состояние: несколько отправок = одна запись.
+        # data=None — только строки журнала
+        with self._cond:
+            if full:
+                # сброс пишется как есть, и чужие изменения до него сессии уже не нужны
+                self._remote = {}
+            if data is not None:
+                self._data = data if full else _shifted(data, self._remote)
+            self._entries.extend(entries)
+            self._full = self._full or full
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="store-writer", daemon=True)
+                self._thread.start()
+            elif self._pending >= self.max_pending:
+                self._cond.notify()
+
+    def reset(self, data):
+        """Сброс: итоги -> data как есть, сторно в журнал — при записи (см. выше)."""
+        with self._cond:
+            self._reset = True
+            self.submit(data, full=True)
+
+    def flush(self):
+        """Синхронно пишет всё накопленное. True — если в очереди ничего не осталось."""
+        with self._flush_lock:
+            with self._cond:
+                if self._data is None and not self._entries:
+                    return True
+                data, entries, full, reset, n = self._data, self._entries, self._full, self._reset, self._pending
+                self._data, self._entries, self._full, self._reset, self._pending = None, [], False, False, 0
+            saved, remote = data is None, {}
+            try:
+                # Сначала журнал, потом итоги: итоги всегда можно пересчитать из журнала.
+                # Сторно сброса — сразу после него: до записи неизвестно, что он перезапишет
+                if entries:
+                    self.store.append_ledger(entries)
+                    entries = []
+                if reset:
+                    self.synced, previous = self.store.replace(data)
+                    saved, entries = True, _reversals(previous, data)
+                    if entries:
+                        self.store.append_ledger(entries)
+                        entries = []
+                elif not saved:
+                    self.synced = self.store.save(data, self.synced, full=full)
+                    saved = True
+                    remote = {m: d for m, d in _delta(self.synced, data).items() if d}
+            except Exception as e:
+                # Возвращаем в очередь, если поверх не пришло более свежее состояние
+                with self._cond:
+                    if not saved and self._data is None:
+                        self._data = data
+                        self._full = self._full or full
+                        self._reset = self._reset or reset
+                    self._entries[:0] = entries
+                    self._pending += n
+                self.last_error = e
+                return False
+            self._absorb(remote)
+            self.last_flush = datetime.now()
+            self.last_error = None
+            return True
+
+    def pull(self):
+        """
+        Сверяет снимок synced с хранилищем и копит чужие изменения для
+        take_remote(). Таблица читается через общий кэш процесса — без
+        запроса к API, пока он свежий.
+        Пока идёт запись или не сверена оборвавшаяся, ничего не делает.
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            synced = self.synced
+            if synced is None or getattr(synced, "attempt", None) is not None:
+                return
+            _, fresh = self.store.load(None)
+            known, current = getattr(synced, "revision", None), getattr(fresh, "revision", None)
+            if known is not None and current is not None and current <= known:
+                return
+            remote = {m: d for m, d in _delta(fresh, synced).items() if d}
+            self.synced = fresh
+        finally:
+            self._flush_lock.release()
+        self._absorb(remote)
+
+    def _absorb(self, remote):
+        """Чужие изменения ({месяц: копейки}) — в take_remote() и в ещё не записанное состояние."""
+        # в очереди сброс — он перезапишет и чужие изменения, показывать их незачем
+        with self._cond:
+            if remote and not self._full:
+                for m, d in remote.items():
+                    self._remote[m] = self._remote.get(m, 0) + d
+                if self._data is not None:
+                    self._data = _shifted(self._data, remote)
+
+    def take_remote(self):
+        """Изменения других сессий, влитые при записи: {месяц: копейки}; дальше их учитывает сама сессия."""
+        with self._cond:
+            remote, self._remote = self._remote, {}
+        return remote
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending >= self.max_pending, timeout=self.interval)
+            self.flush()
+            with self._cond:
+                # не записалось — данные вернулись в очередь, повторим через interval
+                if self._data is None and not self._entries:
+                    self._thread = None
+                    return
+
+
+# ---------------- Действия сессии ----------------
+# Общие для дашбордов: пополнение и сброс над Savings сессии и её StoreWriter.
+
+def apply_deposit(writer, savings, table, month, amounts, currencies):
+    """
+    Пополнение месяца month суммами amounts в валютах currencies: копейки по
+    курсам table (money.RateTable) — в savings, итоги и строки журнала — в
+    очередь writer. Возвращает внесённое в копейках.
+    """
+    kopecks = table.kopecks(amounts, currencies)
+    entries = [
+        ledger_entry(month, cur, amount, table.unit(cur), rub(k))
+        for cur, amount, k in zip(currencies, amounts, kopecks)
+        if amount
+    ]
+    added = int(kopecks.sum())
+    savings.add(month, added)
+    writer.submit(savings.to_dict(), entries)
+    return added
+
+
+def apply_reset(writer, savings):
+    """
+    Сброс: пустые накопления на том же горизонте пишутся сразу, не дожидаясь
+    фонового потока; журнал не переписывается — в него уходит сторно
+    (StoreWriter.reset). Возвращает (пустые Savings, записалось ли).
+    """
+    cleared = savings.cleared()
+    writer.reset(cleared.to_dict())
+    return cleared, writer.flush()
@@ -0,0 +1,160 @@
+"""
+Замер задержки перезапусков дашбордов в headless-режиме (streamlit AppTest).
+
+gspread подменяется таблицей в памяти (bench/fakes.py) с задержкой на каждый
+вызов API, cbr-xml-daily.ru — локальным HTTP-сервером. Для каждого
+приложения и размера таблицы выводятся:
+  cold   — первый запуск: пустые кэши процесса и пустая база курсов
+  rerun  — медиана повторных перезапусков без действий пользователя
+  submit — перезапуск после «Добавить» (+ сброс очереди записи в таблицу)
+  restart — первый запуск после перезапуска воркера: кэши процесса пустые,
+           но снимок итогов на диске (snapshots.py) и база курсов уже есть
+и число обращений к Sheets API / ЦБ на каждое из этих действий.
+
+    python bench/bench_reruns.py
+    python bench/bench_reruns.py --apps upd.py --months 12 1200 --latency 0.05 --json bench.json
+    python bench/bench_reruns.py --backend sqlite   # накопления в локальной базе, без Sheets API
+    python bench/bench_reruns.py --quota-errors 0.2 # каждый пятый вызов Sheets API — 429
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import charts  # noqa: E402
+import rates  # noqa: E402
+import snapshots  # noqa: E402
+import storage  # noqa: E402
+from periods import MonthIndex  # noqa: E402
+from fakes import CbrStub, FakeClient  # noqa: E402
+
+APPS = ["upd.py", "main.py", "untitled47.py"]
+MONTHS = [12, 120, 1200]
+START_DATE = date(2025, 7, 13)  # значение по умолчанию в сайдбаре
+
+
+def sheet_rows(months):
+    rows = [list(storage.HEADER)]
+    for i, key in enumerate(MonthIndex(START_DATE, months).keys):
+        rows.append([key, float(1000 * (i % 7))])
+    return rows
+
+
+def reset_process_state(client, stub, tmp):
+    """Всё, что живёт на процесс между перезапусками, — в исходное состояние; файлы — в каталоге tmp."""
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    storage._read_cache.clear()
+    storage._gspread_client = lambda: client
+    for fn in (charts.progress_pie, charts.plan_pie, charts.monthly_fact_line):
+        fn.cache_clear()
+    projection = sys.modules.get("projection")  # грузится лениво — не тянем numpy/pandas раньше замера
+    if projection is not None:
+        projection.rate_moments.cache_clear()
+        projection.forecast.cache_clear()
+    rates.RATES_DB = os.path.join(tmp, "rates.sqlite3")
+    snapshots.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+    rates._table = (None, None)
+    rates.CBR_URL = f"{stub.url}/daily_json.js"
+    rates.CBR_DYNAMIC_URL = f"{stub.url}/XML_dynamic.asp"
+
+
+def counted(client, stub, fn):
+    client.reset_counters()
+    stub.requests = 0
+    t = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t
+    return elapsed, sum(client.calls.values()), stub.requests, dict(client.calls)
+
+
+def check(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def submit(at):
+    rub = next(w for w in at.number_input if "RUB" in w.label)
+    rub.set_value(1000.0)
+    next(b for b in at.button if b.label == "Добавить").click()
+    at.run()
+    check(at)
+    if "writer" in at.session_state:
+        at.session_state["writer"].flush()
+
+
+def bench_app(app, months, latency, reruns, backend, error_rate=0.0):
+    client = FakeClient(sheet_rows(months), latency=latency, error_rate=error_rate)
+    stub = CbrStub(latency=latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SAVINGS_BACKEND"] = backend
+        os.environ["SAVINGS_PATH"] = os.path.join(tmp, f"savings.{backend}")
+        reset_process_state(client, stub, tmp)
+        at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=120)
+
+        def cold():
+            at.run()
+            check(at)
+
+        result = {"app": app, "months": months, "latency": latency, "backend": backend}
+        result["cold"] = counted(client, stub, cold)
+
+        steady = []
+        for _ in range(reruns):
+            steady.append(counted(client, stub, lambda: (at.run(), check(at))))
+        result["rerun"] = (statistics.median(s[0] for s in steady),) + steady[-1][1:]
+
+        result["submit"] = counted(client, stub, lambda: submit(at))
+
+        reset_process_state(client, stub, tmp)
+        at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=120)
+        result["restart"] = counted(client, stub, cold)
+    stub.close()
+    return result
+
+
+def print_table(results):
+    print(f"{'app':<15}{'months':>7}  {'phase':<7}{'ms':>9}{'sheets':>8}{'cbr':>5}  calls")
+    for r in results:
+        for phase in ("cold", "rerun", "submit", "restart"):
+            ms, sheets, cbr, calls = r[phase]
+            detail = ", ".join(f"{k}={v}" for k, v in sorted(calls.items()))
+            print(f"{r['app']:<15}{r['months']:>7}  {phase:<7}{ms * 1000:>9.1f}{sheets:>8}{cbr:>5}  {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apps", nargs="+", default=APPS)
+    parser.add_argument("--months", nargs="+", type=int, default=MONTHS)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка на вызов API, сек")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--backend", default="sheets", choices=["sheets", "sqlite", "json"],
+                        help="хранилище накоплений (SAVINGS_BACKEND)")
+    parser.add_argument("--quota-errors", type=float, default=0.0,
+                        help="доля вызовов Sheets API, отвечающих 429 (проверка повторов)")
+    parser.add_argument("--json", help="куда сохранить результаты")
+    args = parser.parse_args()
+
+    results = [
+        bench_app(app, m, args.latency, args.reruns, args.backend, args.quota_errors)
+        for app in args.apps for m in args.months
+    ]
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
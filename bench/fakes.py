@@ -0,0 +1,221 @@
+# ---------------- Подмены для бенчмарков ----------------
+# FakeClient — gspread в памяти: таблица = список строк, у каждого вызова
+# API настраиваемая задержка и счётчик. CbrStub — локальный HTTP-сервер,
+# который отдаёт daily_json.js и XML_dynamic.asp вместо cbr-xml-daily.ru.
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gspread
+
+DAILY_JSON = {
+    "Date": "2026-10-17T11:30:00+03:00",
+    "Valute": {
+        "USD": {"ID": "R01235", "Name": "Доллар США", "Nominal": 1, "Value": 81.5, "Previous": 81.2},
+        "UZS": {"ID": "R01717", "Name": "Узбекских сумов", "Nominal": 10000, "Value": 67.1, "Previous": 67.3},
+    },
+}
+
+
+def _cell(a1):
+    col, row = re.fullmatch(r"([A-Z]+)(\d+)", a1).groups()
+    return int(row) - 1, ord(col) - ord("A")
+
+
+def _range(a1):
+    """'A2:B13' -> (r0, c0, r1, c1), включительно; 'B5' -> одна ячейка."""
+    a1 = a1.split("!")[-1]
+    start, _, end = a1.partition(":")
+    r0, c0 = _cell(start)
+    if not end:
+        return r0, c0, r0, c0
+    if end.isalpha():  # 'A2:B' — до конца листа
+        return r0, c0, None, ord(end) - ord("A")
+    r1, c1 = _cell(end)
+    return r0, c0, r1, c1
+
+
+class FakeWorksheet:
+    """Лист в памяти с тем подмножеством API gspread.Worksheet, которым пользуется приложение."""
+
+    def __init__(self, spreadsheet, title, rows=None):
+        self.spreadsheet = spreadsheet
+        self.spreadsheet_id = spreadsheet.id
+        self.title = title
+        self.rows = [list(r) for r in rows or []]
+
+    def _call(self, name, payload=0):
+        self.spreadsheet.client.hit(name, payload)
+
+    def _ensure(self, r, c):
+        while len(self.rows) <= r:
+            self.rows.append([])
+        row = self.rows[r]
+        while len(row) <= c:
+            row.append("")
+
+    def get_values(self, range_name=None, **kwargs):
+        self._call("get_values")
+        if range_name is None:
+            return [list(r) for r in self.rows]
+        return self._values(range_name)
+
+    def _values(self, range_name):
+        r0, c0, r1, c1 = _range(range_name)
+        r1 = len(self.rows) - 1 if r1 is None else r1
+        out = [list(r[c0:c1 + 1]) for r in self.rows[r0:r1 + 1]]
+        while out and not any(v != "" for v in out[-1]):
+            out.pop()
+        return out
+
+    def batch_get(self, ranges, **kwargs):
+        self._call("batch_get")
+        return [self._values(rng) for rng in ranges]
+
+    def get_all_records(self, **kwargs):
+        self._call("get_all_records")
+        header, *body = self.rows or [[]]
+        return [dict(zip(header, r)) for r in body]
+
+    def _write(self, range_name, values):
+        r0, c0, _, _ = _range(range_name)
+        for i, row in enumerate(values):
+            for j, v in enumerate(row):
+                self._ensure(r0 + i, c0 + j)
+                self.rows[r0 + i][c0 + j] = v
+
+    def update(self, values, range_name="A1", **kwargs):
+        self._call("update", sum(len(r) for r in values))
+        self._write(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        self._call("batch_update", sum(len(r) for d in data for r in d["values"]))
+        for d in data:
+            self._write(d["range"], d["values"])
+
+    def clear(self):
+        self._call("clear")
+        self.rows = []
+
+    def batch_clear(self, ranges):
+        self._call("batch_clear")
+        for rng in ranges:
+            r0, c0, r1, c1 = _range(rng)
+            r1 = len(self.rows) - 1 if r1 is None else r1
+            for r in range(r0, min(r1 + 1, len(self.rows))):
+                for c in range(c0, min(c1 + 1, len(self.rows[r]))):
+                    self.rows[r][c] = ""
+
+    def append_row(self, values, **kwargs):
+        self._call("append_row", len(values))
+        self.rows.append(list(values))
+
+    def append_rows(self, values, **kwargs):
+        self._call("append_rows", sum(len(r) for r in values))
+        self.rows.extend(list(r) for r in values)
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, spreadsheet_id, rows):
+        self.client = client
+        self.id = spreadsheet_id
+        self.sheet1 = FakeWorksheet(self, "Sheet1", rows)
+        self._sheets = {"Sheet1": self.sheet1}
+
+    def worksheet(self, title):
+        self.client.hit("worksheet")
+        if title not in self._sheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.client.hit("add_worksheet")
+        self._sheets[title] = FakeWorksheet(self, title)
+        return self._sheets[title]
+
+
+class _QuotaResponse:
+    """Ответ 429, из которого gspread.exceptions.APIError собирает ошибку."""
+
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        return {"error": {"code": 429, "message": self.text, "status": "RESOURCE_EXHAUSTED"}}
+
+
+class FakeClient:
+    """
+    Подмена gspread.Client: одна таблица в памяти, задержка latency сек на
+    каждый вызов API; доля error_rate вызовов отвечает 429 (квота).
+    """
+
+    def __init__(self, rows=None, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.cells = 0
+        self._lock = threading.Lock()
+        self._rows = rows or []
+        self._spreadsheets = {}
+
+    def hit(self, name, cells=0):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.calls["429"] += 1
+            raise gspread.exceptions.APIError(_QuotaResponse())
+        with self._lock:
+            self.calls[name] += 1
+            self.cells += cells
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.cells = 0
+
+    def open_by_key(self, key):
+        self.hit("open_by_key")
+        if key not in self._spreadsheets:
+            self._spreadsheets[key] = FakeSpreadsheet(self, key, self._rows)
+        return self._spreadsheets[key]
+
+
+class CbrStub:
+    """Локальный сервер вместо cbr-xml-daily.ru / cbr.ru; считает запросы."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if self.path.startswith("/daily_json.js"):
+                    body, ctype = json.dumps(DAILY_JSON).encode(), "application/json"
+                else:
+                    body, ctype = b'<?xml version="1.0" encoding="windows-1251"?><ValCurs/>', "text/xml"
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
@@ -0,0 +1,99 @@
+# ---------------- Построение графиков ----------------
+# Фигуры собираются один раз на набор входных данных и берутся из
+# ограниченного LRU-кэша процесса: пока цифры не поменялись, перезапуски
+# скрипта (в любой сессии) не пересобирают px.pie / go.Figure заново.
+# Все аргументы — хэшируемые (кортежи, числа, строки).
+# Возвращаемые фигуры общие — менять их на месте нельзя.
+# В трассу (фаза figures) попадает только реальное построение, не попадания в кэш.
+# plotly импортируется при первом построении, а не при импорте модуля.
+
+from functools import lru_cache
+
+from tracing import traced
+
+CACHE_SIZE = 64
+MAX_POINTS = 2000     # точек на трассу: больше на ширине экрана всё равно не различить
+MARKERS_UP_TO = 120   # до стольких точек рисуем маркеры, дальше — только линию
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+@traced("figures")
+def progress_pie(labels, values, start_capital, remaining, title=None):
+    """Начальный капитал + месяцы с вкладом > 0 + остаток до цели."""
+    import plotly.express as px
+
+    active = [(m, v) for m, v in zip(labels, values) if v > 0]
+    return px.pie(
+        names=["Начальный капитал"] + [m for m, _ in active] + ["Остаток"],
+        values=[start_capital] + [v for _, v in active] + [remaining],
+        title=title,
+        hole=0.4,
+    )
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+@traced("figures")
+def plan_pie(labels, monthly_plan, title=None):
+    """План по месяцам: одинаковый кусок на каждый месяц."""
+    import plotly.express as px
+
+    return px.pie(names=list(labels), values=[monthly_plan] * len(labels), title=title, hole=0.4)
+
+
+def minmax_buckets(values, max_points=MAX_POINTS):
+    """
+    Индексы точек ряда для отрисовки. Ряд длиннее max_points делится на
+    равные корзины, из каждой берутся минимум и максимум (плюс крайние
+    точки): пики и провалы остаются на месте, а точек — не больше
+    max_points, сколько бы ни было исходных. Всё — векторно, без цикла по корзинам.
+    """
+    import numpy as np
+
+    values = np.asarray(values)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = (max_points - 2) // 2
+    edges = np.linspace(0, n, buckets + 1).astype("int64")
+    ids = np.repeat(np.arange(buckets), np.diff(edges))
+    keep = [[0, n - 1]]
+    for reduce in (np.minimum, np.maximum):
+        extreme = np.flatnonzero(values == reduce.reduceat(values, edges[:-1])[ids])
+        keep.append(extreme[np.unique(ids[extreme], return_index=True)[1]])  # первое вхождение в корзине
+    return np.unique(np.concatenate(keep))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+@traced("figures")
+def monthly_fact_line(dates, values, monthly_plan):
+    """
+    Факт накоплений за каждый период (без суммирования) с линией плана.
+    Ось дат и масштаб — по данным и monthly_plan; длинный ряд прорежен
+    minmax_buckets и рисуется WebGL-трассой, так что объём фигуры и время
+    отрисовки не растут с историей.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    y = np.asarray(values, dtype="float64")
+    keep = minmax_buckets(y)
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=np.asarray(dates, dtype="datetime64[D]")[keep],
+        y=y[keep],
+        name="Факт (за период)" if len(keep) < len(y) else "Факт (за месяц)",
+        mode="lines+markers" if len(keep) <= MARKERS_UP_TO else "lines",
+    ))
+    # пунктир — план в месяц
+    fig.add_hline(
+        y=monthly_plan,
+        line_dash="dot",
+        annotation_text=f"План в месяц {monthly_plan:,.0f} ₽".replace(",", "\u00a0"),
+        annotation_position="top left"
+    )
+    top = max(float(y.max(initial=0.0)), monthly_plan)
+    bottom = min(float(y.min(initial=0.0)), 0.0)
+    pad = (top - bottom) * 0.1 or 1.0  # запас сверху под подпись плана
+    fig.update_yaxes(range=[bottom - (pad if bottom < 0 else 0.0), top + pad], title_text="₽")
+    fig.update_xaxes(title_text="Месяц")
+    return fig
@@ -0,0 +1,20 @@
+# ---------------- Исходные накопления в валютах ----------------
+# Общий для приложений ввод портфеля в сайдбаре: набор валют выбирается из
+# всех, что публикует ЦБ (money.RateTable.codes), и на каждую — своё поле.
+# Новая валюта (EUR, KZT, ...) не требует ни кода, ни отдельного запроса:
+# её курс уже есть в той же котировке.
+
+import streamlit as st
+
+DEFAULT_HOLDINGS = {"USD": 12000.0, "UZS": 51000000.0}
+
+
+def holdings_sidebar(codes, defaults=DEFAULT_HOLDINGS):
+    """Мультивыбор валют + поле суммы на каждую. Возвращает {код: сумма}."""
+    selected = st.sidebar.multiselect(
+        "Валюты накоплений", codes, default=[c for c in defaults if c in codes], key="holding_codes"
+    )
+    return {
+        code: st.sidebar.number_input(f"Накоплено ({code})", value=defaults.get(code, 0.0), key=f"holding_{code}")
+        for code in selected
+    }
@@ -0,0 +1,201 @@
+# ---------------- Массовый импорт истории накоплений ----------------
+# История из xlsx/csv (дата, сумма, необязательно — валюта) читается
+# потоково кусками по CHUNK_ROWS строк: xlsx — openpyxl в read_only, csv —
+# pandas с chunksize, так что файл целиком в памяти не держим. Суммы
+# разбираются векторно в целые сотые (money.to_minor), каждый кусок сразу
+# сворачивается в суммы по (день, валюта). Валютные суммы пересчитываются в
+# копейки по курсу ЦБ на день операции (money.to_kopecks), дни — в ключи
+# месяцев «2025-07» (periods.py), те же, что у формы «Добавить».
+#
+# Результат — итог по (месяц, валюта); в хранилище он уходит одной записью
+# итогов и одним append журнала (строка на месяц и валюту, а не на каждую
+# исходную строку), независимо от числа строк в файле.
+#
+#     python importer.py history.csv --date Дата --amount Сумма
+#     python importer.py history.xlsx --sheet История --date Дата --amount Сумма --currency Валюта --dry-run
+
+import argparse
+import os
+import zipfile
+from datetime import datetime
+
+from money import fixed_rates, rub, to_kopecks, to_minor
+from periods import parse_month, to_dates
+from storage import ledger_entry
+
+# ID таблицы по умолчанию — тот же, что в приложениях
+SPREADSHEET_ID = "1-D2RvWH5WUP00KqA18mAfj3kDOpedMkOwo8UI_Xd_A4"
+CHUNK_ROWS = 50_000
+
+
+def _is_xlsx(source):
+    name = getattr(source, "name", source)
+    return str(name).lower().endswith((".xlsx", ".xlsm"))
+
+
+def _xlsx_chunks(source, sheet, chunk_rows):
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+    import pandas as pd
+
+    try:
+        wb = load_workbook(source, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        # битый файл или не xlsx — для вызывающих это такая же ошибка разбора, как и прочие
+        raise ValueError(f"не удалось открыть как xlsx ({e})") from e
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        wb.close()
+
+
+def _csv_chunks(source, chunk_rows):
+    import pandas as pd
+
+    # Разделитель угадываем по первой строке: русский Excel сохраняет CSV через «;»
+    if hasattr(source, "read"):
+        head = source.readline()
+        source.seek(0)
+    else:
+        with open(source, "rb") as f:
+            head = f.readline()
+    if isinstance(head, bytes):
+        head = head.decode("utf-8-sig", errors="replace")
+    sep = ";" if head.count(";") > head.count(",") else ","
+    yield from pd.read_csv(source, sep=sep, dtype=str, chunksize=chunk_rows, encoding="utf-8-sig")
+
+
+def read_chunks(source, sheet=None, chunk_rows=CHUNK_ROWS):
+    """DataFrame'ы по chunk_rows строк из xlsx/csv (путь или открытый файл); первая строка — заголовок."""
+    if _is_xlsx(source):
+        return _xlsx_chunks(source, sheet, chunk_rows)
+    return _csv_chunks(source, chunk_rows)
+
+
+def _to_rub(daily):
+    """Добавляет колонку kopecks: суммы в ₽ по курсу ЦБ на день операции (последний известный до него)."""
+    import pandas as pd
+    from rates import backfill, history
+
+    daily["kopecks"] = daily["amount"]
+    foreign = daily["currency"] != "RUB"
+    if not foreign.any():
+        return daily
+    codes = sorted(daily.loc[foreign, "currency"].unique())
+    start, end = daily["date"].min().date(), daily["date"].max().date()
+    for code in codes:
+        backfill(code, start, end)  # история курсов — одним запросом на валюту
+    quotes = history(codes, start, end).sort_values("date")
+    quotes["date"] = quotes["date"].astype("datetime64[ns]")
+    part = daily[foreign].reset_index().sort_values("date")
+    part["date"] = part["date"].astype("datetime64[ns]")
+    part = pd.merge_asof(part, quotes, on="date", by="currency", direction="backward")
+    missing = sorted(part.loc[part["value"].isna(), "currency"].unique())
+    if missing:
+        raise ValueError(f"Нет курса ЦБ для {', '.join(missing)} на даты импорта")
+    daily.loc[part["index"], "kopecks"] = to_kopecks(
+        part["amount"].to_numpy(), fixed_rates(part["value"]), part["nominal"].to_numpy()
+    )
+    return daily
+
+
+def aggregate(source, date_col, amount_col, currency_col=None, sheet=None, chunk_rows=CHUNK_ROWS):
+    """
+    Итоги импорта: (DataFrame(period, currency, amount, kopecks, month) по
+    месяцам и валютам, прочитано строк, пропущено строк — без даты или суммы).
+    amount — сотые доли валюты, kopecks — то же в рублях; оба int64.
+    """
+    import pandas as pd
+
+    parts, read, skipped = [], 0, 0
+    for chunk in read_chunks(source, sheet, chunk_rows):
+        read += len(chunk)
+        frame = pd.DataFrame({
+            "date": to_dates(chunk[date_col]).dt.normalize(),
+            "amount": to_minor(chunk[amount_col]),
+            "currency": (
+                chunk[currency_col].fillna("RUB").astype(str).str.strip().str.upper()
+                if currency_col else "RUB"
+            ),
+        })
+        valid = frame["date"].notna() & (frame["amount"] != 0)
+        skipped += int((~valid).sum())
+        # кусок сразу сворачиваем по дням; в памяти — только дневные итоги
+        parts.append(frame[valid].groupby(["date", "currency"], as_index=False)["amount"].sum())
+
+    if not parts:
+        return pd.DataFrame(columns=["period", "currency", "amount", "kopecks", "month"]), read, skipped
+    daily = pd.concat(parts, ignore_index=True).groupby(["date", "currency"], as_index=False)["amount"].sum()
+    daily = _to_rub(daily)
+    daily["period"] = daily["date"].dt.to_period("M")
+    totals = daily.groupby(["period", "currency"], as_index=False)[["amount", "kopecks"]].sum()
+    totals["month"] = totals["period"].dt.strftime("%Y-%m")
+    return totals, read, skipped
+
+
+def apply_import(data, totals):
+    """
+    Добавляет итоги импорта к {месяц: ₽}. Возвращает (новые данные, строки журнала).
+    Месяцы — ключи ISO в календарном порядке; старые подписи ('July 2025')
+    переводятся в ключи и складываются с тем же месяцем.
+    """
+    merged = {}
+    for month, kopecks in zip(data, to_minor(list(data.values())).tolist()):
+        key = parse_month(month) or str(month)
+        merged[key] = merged.get(key, 0) + kopecks
+    for month, kopecks in totals.groupby("month")["kopecks"].sum().items():
+        merged[month] = merged.get(month, 0) + int(kopecks)
+    data = {m: rub(v) for m, v in sorted(merged.items())}
+    entries = [
+        ledger_entry(r.month, r.currency, rub(r.amount), r.kopecks / r.amount if r.amount else 0.0, rub(r.kopecks))
+        for r in totals.itertuples(index=False)
+    ]
+    return data, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт истории накоплений из xlsx/csv")
+    parser.add_argument("path")
+    parser.add_argument("--date", required=True, help="колонка с датой операции")
+    parser.add_argument("--amount", required=True, help="колонка с суммой")
+    parser.add_argument("--currency", help="колонка с кодом валюты (по умолчанию всё в ₽)")
+    parser.add_argument("--sheet", help="лист xlsx (по умолчанию первый)")
+    parser.add_argument("--spreadsheet", default=os.environ.get("SPREADSHEET_ID", SPREADSHEET_ID))
+    parser.add_argument("--dry-run", action="store_true", help="только показать итоги, ничего не писать")
+    args = parser.parse_args()
+
+    started = datetime.now()
+    totals, read, skipped = aggregate(args.path, args.date, args.amount, args.currency, args.sheet)
+    print(totals.assign(amount=rub(totals["amount"]), rub=rub(totals["kopecks"]))[
+        ["month", "currency", "amount", "rub"]
+    ].to_string(index=False))
+    print(f"Строк: {read}, пропущено: {skipped}, месяцев: {totals['month'].nunique()}")
+    if args.dry_run or totals.empty:
+        return
+
+    from backends import open_store
+
+    store = open_store(args.spreadsheet)
+    data, synced = store.load(None)  # None — все месяцы хранилища
+    data, entries = apply_import(data, totals)
+    # одна запись журнала и одна запись итогов на весь файл
+    store.append_ledger(entries)
+    store.save(data, synced)
+    mirror = getattr(store, "mirror", None)
+    if mirror is not None:
+        mirror.flush()  # процесс сейчас завершится — не оставляем зеркало позади
+    print(f"Записано в {store.name} за {(datetime.now() - started).total_seconds():.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# ---------------- Время импорта модулей ----------------
+# Встроенный аналог `python -X importtime`: install() ставит первым в
+# sys.meta_path искатель, который оборачивает загрузчики и замеряет
+# выполнение каждого модуля при первом импорте — полное время (вместе с
+# вложенными импортами) и собственное. Работает только на импорты после
+# install(), поэтому вызывается первой строкой в точках входа.
+#
+# Отчёт общий на процесс: report() отдаёт замеры, накопленные с прошлого
+# вызова, — их забирает трасса перезапуска (см. tracing.finish_trace), так
+# что стоимость холодного старта видна в отладочной панели (и в TRACE_FILE)
+# рядом с фазами.
+#
+#     python importtime.py pandas plotly.express gspread   # разовый замер из консоли
+
+import importlib.abc
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+_local = threading.local()
+_records = {}     # модуль -> {"ms": полное, "self_ms": собственное}
+_unreported = []  # модули, ещё не попавшие в report()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Обёртка загрузчика: в модуле остаётся исходный загрузчик, замеряется только exec_module."""
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        stack = _local.__dict__.setdefault("stack", [])
+        stack.append(0.0)  # время вложенных импортов
+        t = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - t
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with _lock:
+                _records[module.__name__] = {
+                    "ms": round(elapsed * 1000, 2),
+                    "self_ms": round((elapsed - nested) * 1000, 2),
+                }
+                _unreported.append(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+_finder = _TimingFinder()
+
+
+def install():
+    """Включает замеры (повторный вызов ничего не делает)."""
+    if _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+
+def report(top=15):
+    """
+    Замеры с прошлого вызова: {"total_ms", "modules", "top": [(модуль, мс), ...]}
+    или None, если новых импортов не было. total_ms — сумма собственного времени
+    модулей, т.е. сколько реально ушло на импорты (вложенные не считаются дважды).
+    """
+    with _lock:
+        names = list(_unreported)
+        _unreported.clear()
+        records = {n: _records[n] for n in names}
+    if not records:
+        return None
+    heaviest = sorted(records.items(), key=lambda kv: -kv[1]["ms"])[:top]
+    return {
+        "total_ms": round(sum(records[n]["self_ms"] for n in records), 2),
+        "modules": len(records),
+        "top": [(name, r["ms"]) for name, r in heaviest],
+    }
+
+
+if __name__ == "__main__":
+    install()
+    for name in sys.argv[1:]:
+        __import__(name)
+    result = report(top=30)
+    if result:
+        print(f"{result['modules']} модулей, {result['total_ms']:.1f} мс")
+        for name, ms in result["top"]:
+            print(f"{ms:>10.1f}  {name}")
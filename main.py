@@ -1,149 +1,148 @@
+import importtime
+importtime.install()
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import requests
-from datetime import date, timedelta
-import gspread
-from google.oauth2.service_account import Credentials
+from datetime import date
+
+from charts import plan_pie, progress_pie
+from holdings import holdings_sidebar
+from money import MAX_AMOUNT, rub
+from periods import DEFAULT_HORIZON, MAX_HORIZON, MonthIndex, Savings, month_label
+from progress import goal_progress
+from rates import fetch_exchange_rates, rate_table
+from backends import StoreWriter, apply_deposit, apply_reset, open_store
+from sheets_scheduler import status_line as sheets_status_line
+from storage import connect_error_message
+from tracing import finish_trace, phase, render_debug_panel, start_trace
 
 # ---------------- Настройки ----------------
 st.set_page_config(page_title="Финансовый дашборд", layout="wide")
+start_trace("main.py")
 
 # ID твоей таблицы (из URL между /d/ и /edit)
 SPREADSHEET_ID = "1-D2RvWH5WUP00KqA18mAfj3kDOpedMkOwo8UI_Xd_A4"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-
-# Авторизация
-try:
-    credentials = Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"], scopes=SCOPES
-    )
-    gc = gspread.authorize(credentials)
-    sheet = gc.open_by_key(SPREADSHEET_ID).sheet1
-except gspread.SpreadsheetNotFound:
-    st.error(
-        "❌ Google Sheet не найден.\n\n"
-        "Проверь, что:\n"
-        "1. ID таблицы указан верно.\n"
-        "2. Таблица доступна для сервисного аккаунта:\n"
-        f"   `{st.secrets['gcp_service_account']['client_email']}`\n"
-        "   (Добавь его как 'Редактор' через 'Поделиться')."
-    )
-    st.stop()
-except Exception as e:
-    st.error(f"Ошибка при подключении к Google Sheets: {e}")
-    st.stop()
 
 # ---------------- Логика работы ----------------
-def fetch_exchange_rates():
-    try:
-        r = requests.get("https://www.cbr-xml-daily.ru/daily_json.js")
-        d = r.json()
-        usd = d['Valute']['USD']['Value']
-        uzs = d['Valute'].get('UZS', {}).get('Value', None)
-        return usd, uzs
-    except:
-        return None, None
-
-def load_savings(month_labels):
-    records = sheet.get_all_records()
-    data = {m: 0 for m in month_labels}
-    for row in records:
-        if row.get("Месяц") in data:
-            try:
-                data[row["Месяц"]] = float(row["Накоплено (₽)"])
-            except:
-                data[row["Месяц"]] = 0
-    return data
-
-def save_savings(data):
-    rows = [["Месяц", "Накоплено (₽)"]]
-    for m, v in data.items():
-        rows.append([m, v])
-    sheet.clear()
-    sheet.update(rows)
+def render_flush_status(writer):
+    last = f"{writer.last_flush:%H:%M:%S}" if writer.last_flush else "—"
+    st.sidebar.caption(f"Ожидают записи ({writer.store.name}): {writer.pending} · последняя запись: {last}")
+    if writer.last_error is not None:
+        st.sidebar.warning(f"Не удалось записать ({writer.store.name}), повторим: {writer.last_error}")
+    mirror = getattr(writer.store, "mirror", None)
+    if mirror is not None and mirror.last_error is not None:
+        st.sidebar.warning(f"Зеркало в Google Sheets отстаёт, повторим: {mirror.last_error}")
+    quota = sheets_status_line()
+    if quota:
+        st.sidebar.caption(quota)
 
 def recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date):
-    pie_labels = list(st.session_state.savings_by_month.keys())
-    pie_values = list(st.session_state.savings_by_month.values())
-    accumulated = start_capital + sum(pie_values)
-    remaining_to_goal = max(0, goal_rub - accumulated)
-    estimated_months = int(remaining_to_goal / monthly_plan_rub) if monthly_plan_rub else 1
-    estimated_finish_date = start_date + timedelta(days=estimated_months * 30)
-    percent_complete = accumulated / goal_rub * 100 if goal_rub else 0
+    savings = st.session_state.savings
+    pie_labels, pie_values = savings.nonzero()
+    accumulated, remaining_to_goal, estimated_finish_date, percent_complete = goal_progress(
+        goal_rub, start_capital, rub(savings.total()), monthly_plan_rub, start_date
+    )
     return pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete
 
 # ---------------- Основное приложение ----------------
 def main():
     st.title("💰 Финансовый дашборд")
 
-    usd_rate, uzs_rate = fetch_exchange_rates()
+    # Хранилище (по умолчанию Google Sheets, см. backends.py) открывается раз на
+    # процесс, повторные перезапуски скрипта не ходят ни за токеном, ни за
+    # метаданными таблицы
+    try:
+        with phase("store_connect"):
+            store = open_store(SPREADSHEET_ID)
+    except Exception as e:
+        st.error(connect_error_message(e))
+        return
+
+    usd_rate, _, uzs_rate, _, _ = fetch_exchange_rates()
     if usd_rate is None or uzs_rate is None:
         st.error("Не удалось загрузить курс валют")
         return
 
     # Ввод исходных данных
     st.sidebar.header("Ввод исходных данных")
-    usd_saved = st.sidebar.number_input("Накоплено (USD)", value=12000.0)
-    uzs_saved = st.sidebar.number_input("Накоплено (UZS)", value=51000000.0)
+    table = rate_table()
+    holdings = holdings_sidebar(table.codes)
     goal_rub = st.sidebar.number_input("Итоговая цель (₽)", value=4498000.0)
     monthly_plan_rub = st.sidebar.number_input("План в месяц (₽)", value=271634.0)
     start_date = st.sidebar.date_input("Дата начала", value=date(2025, 7, 13))
-
-    rub_from_usd = usd_saved * usd_rate
-    rub_from_uzs = (uzs_saved * uzs_rate) / 10000
-    start_capital = rub_from_usd + rub_from_uzs
-
-    month_labels = [(start_date + timedelta(days=30 * i)).strftime('%B %Y') for i in range(12)]
-
-    if "savings_by_month" not in st.session_state:
-        st.session_state.savings_by_month = load_savings(month_labels)
+    horizon = st.sidebar.number_input("Горизонт (мес.)", min_value=1, max_value=MAX_HORIZON, value=DEFAULT_HORIZON)
+
+    start_capital = rub(table.value(holdings))
+
+    index = MonthIndex(start_date, horizon)
+
+    if "savings" not in st.session_state:
+        # все месяцы хранилища: те, что вне горизонта, не затираются при записи
+        data, synced = store.load(None)
+        st.session_state.savings = Savings.from_dict(index, data)
+        st.session_state.writer = StoreWriter(store, synced)
+    elif st.session_state.savings.index != index:
+        st.session_state.savings = st.session_state.savings.reindex(index)
+    savings = st.session_state.savings
+    writer = st.session_state.writer
+    # пополнения других сессий: влитые хранилищем при нашей записи и
+    # записанные с прошлого перезапуска (pull — из общего кэша чтения)
+    writer.pull()
+    for key, kopecks in writer.take_remote().items():
+        savings.add(key, kopecks)
 
     # Диаграмма плана
-    fig_plan = px.pie(names=month_labels, values=[monthly_plan_rub] * len(month_labels), hole=0.4)
-    st.plotly_chart(fig_plan, use_container_width=True)
+    st.plotly_chart(plan_pie(index.labels, monthly_plan_rub), use_container_width=True)
 
     # Диаграмма прогресса
     pie_labels, pie_values, accumulated, remaining_to_goal, finish_date, percent_complete = recalculate_progress(
         goal_rub, start_capital, monthly_plan_rub, start_date
     )
-    fig_pie = px.pie(
-        names=["Начальный капитал"] + [m for m, v in zip(pie_labels, pie_values) if v > 0] + ["Остаток"],
-        values=[start_capital] + [v for v in pie_values if v > 0] + [remaining_to_goal],
-        hole=0.4
+    st.plotly_chart(
+        progress_pie(tuple(pie_labels), tuple(pie_values), start_capital, remaining_to_goal),
+        use_container_width=True,
     )
-    st.plotly_chart(fig_pie, use_container_width=True)
 
     # Сброс данных
     with st.expander("⚙️ Дополнительно"):
         if st.button("Сбросить"):
-            st.session_state.savings_by_month = {m: 0 for m in month_labels}
-            save_savings(st.session_state.savings_by_month)
-            st.success("Данные сброшены")
+            st.session_state.savings, ok = apply_reset(writer, savings)
+            savings = st.session_state.savings
+            if ok:
+                st.success("Данные сброшены")
+            else:
+                st.error(f"Не удалось сохранить сброс ({writer.store.name}): {writer.last_error}")
 
     # Добавление накоплений
     st.subheader("Добавить накопления")
     with st.form("add_savings_form"):
         col1, col2, col3, col4 = st.columns(4)
-        input_usd = col1.number_input("USD", min_value=0.0, value=0.0)
-        input_uzs = col2.number_input("UZS", min_value=0.0, value=0.0)
-        input_rub = col3.number_input("RUB", min_value=0.0, value=0.0)
-        selected_month = col4.selectbox("Месяц", month_labels)
+        input_usd = col1.number_input("USD", min_value=0.0, max_value=MAX_AMOUNT, value=0.0)
+        input_uzs = col2.number_input("UZS", min_value=0.0, max_value=MAX_AMOUNT, value=0.0)
+        input_rub = col3.number_input("RUB", min_value=0.0, max_value=MAX_AMOUNT, value=0.0)
+        selected_month = col4.selectbox("Месяц", index.keys, format_func=month_label)
         submitted = st.form_submit_button("Добавить")
     if submitted:
-        added_total = input_rub + input_usd * usd_rate + (input_uzs * uzs_rate) / 10000
-        st.session_state.savings_by_month[selected_month] += added_total
-        save_savings(st.session_state.savings_by_month)
-        st.success(f"Добавлено {added_total:,.2f} ₽ в {selected_month}")
+        added = apply_deposit(
+            writer, savings, table, selected_month, [input_rub, input_usd, input_uzs], ("RUB", "USD", "UZS")
+        )
+        st.success(f"Добавлено {rub(added):,.2f} ₽ в {month_label(selected_month)}")
+
+    render_flush_status(writer)
 
     # Таблица
     st.markdown("### Таблица накоплений")
+    import pandas as pd
+
     df = pd.DataFrame({
-        "Месяц": month_labels,
-        "План (₽)": [monthly_plan_rub] * len(month_labels),
-        "Накоплено (₽)": [st.session_state.savings_by_month[m] for m in month_labels]
+        "Месяц": index.labels,
+        "План (₽)": monthly_plan_rub,
+        "Накоплено (₽)": savings.series(),
     })
     st.dataframe(df.style.format({"План (₽)": "{:.2f}", "Накоплено (₽)": "{:.2f}"}))
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        finish_trace()
+    render_debug_panel()
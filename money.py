@@ -0,0 +1,159 @@
+# ---------------- Деньги: целые копейки ----------------
+# Суммы внутри расчётов — int64 в сотых долях единицы валюты (копейки,
+# центы, тийины), курсы ЦБ — целые с RATE_SCALE знаками на Nominal единиц.
+# Пересчёт в рубли — одна функция to_kopecks для всех точек входа (форма,
+# стартовый капитал, импорт): целочисленно, с округлением половины от нуля,
+# поэтому сумма тысяч записей не плывёт, как сумма float. RateTable держит
+# курсы всех валют ЦБ векторами и оценивает портфель в любых валютах разом.
+#
+# Всё векторно (NumPy); скаляры — частный случай массива из одного элемента.
+# Наружу (таблица, графики) рубли отдаются float через rub().
+
+KOPECKS = 100        # сотых в единице валюты
+RATE_SCALE = 10_000  # ЦБ публикует Value с 4 знаками после запятой
+MAX_DIGITS = 16      # знаков в целой части суммы: 10**16 единиц в сотых ещё помещаются в int64
+MAX_AMOUNT = 10.0 ** (MAX_DIGITS - 1)  # потолок полей ввода — с запасом ниже предела разбора
+
+_NUMBER = r"^(?P<sign>[-+]?)(?P<int>\d*)(?:\.(?P<frac>\d*))?$"
+
+
+def _round_half_away(num, den):
+    """Целочисленное num / den с округлением половины от нуля (den > 0)."""
+    import numpy as np
+
+    q = (np.abs(num) + den // 2) // den
+    return np.where(num < 0, -q, q)
+
+
+def _float_minor(x):
+    """
+    float -> сотые, половина от нуля. Запас в пару ulp гасит двоичную
+    погрешность (0.285 -> 29, а не 28) и добавляется только к дробной части:
+    на больших суммах, где ulp больше копейки, он не сдвигает целые.
+    """
+    import numpy as np
+
+    too_big = ~(np.abs(x) < 10 ** MAX_DIGITS)  # и inf/NaN
+    if too_big.any():
+        raise ValueError(f"Сумма вне допустимого диапазона: {x[too_big][0]}")
+    scaled = np.abs(x) * KOPECKS
+    whole = np.floor(scaled)
+    up = scaled - whole + np.minimum(2 * np.spacing(scaled), 0.25) >= 0.5
+    return (np.sign(x) * (whole + up)).astype("int64")
+
+
+def to_minor(values):
+    """
+    Колонка сумм -> int64 сотых долей. Числа округляются до сотых; строки
+    ('64 547,36', NBSP, ₽) разбираются точно, без промежуточного float;
+    пустое и мусор -> 0. Сумма, не помещающаяся в int64, — ValueError,
+    а не молча перевёрнутый знак.
+    """
+    import numpy as np
+    import pandas as pd
+
+    col = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_numeric_dtype(col):
+        return _float_minor(col.to_numpy(dtype="float64", na_value=0.0))
+
+    out = np.zeros(len(col), dtype="int64")
+    is_text = col.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    numbers = ~is_text & col.notna().to_numpy()
+    if numbers.any():
+        out[numbers] = _float_minor(col[numbers].to_numpy(dtype="float64"))
+    if is_text.any():
+        text = col[is_text].astype(str).str.replace("[₽\\s\u00a0\u202f]", "", regex=True).str.replace(",", ".")
+        parts = text.str.extract(_NUMBER)
+        ok = parts["int"].notna() & (parts["int"].str.len() + parts["frac"].fillna("").str.len() > 0)
+        too_long = ok & (parts["int"].str.lstrip("0").str.len() > MAX_DIGITS)
+        if too_long.any():
+            raise ValueError(f"Сумма вне допустимого диапазона: {col[is_text][too_long.to_numpy()].iloc[0]}")
+        whole = pd.to_numeric(parts["int"].where(ok, "0").replace("", "0")).to_numpy(dtype="int64")
+        frac = parts["frac"].where(ok, "").fillna("")
+        cents = pd.to_numeric(frac.str[:2].str.ljust(2, "0")).to_numpy(dtype="int64")
+        round_up = (frac.str[2:3] >= "5").to_numpy(dtype=bool)  # третья цифра — округление
+        minor = whole * KOPECKS + cents + round_up
+        out[is_text] = np.where(parts["sign"].fillna("").to_numpy() == "-", -minor, minor)
+    return out
+
+
+def fixed_rates(values):
+    """Курсы ЦБ (₽ за Nominal единиц) -> int64 с RATE_SCALE знаками."""
+    import numpy as np
+
+    return np.round(np.asarray(values, dtype="float64") * RATE_SCALE).astype("int64")
+
+
+def to_kopecks(amounts_minor, rates_fixed, nominals):
+    """
+    Сотые доли валюты -> копейки: amount * Value / Nominal, точно в целых.
+    Делим по частям, чтобы не переполнить int64 на больших суммах.
+    """
+    import numpy as np
+
+    amounts = np.asarray(amounts_minor, dtype="int64")
+    rates = np.asarray(rates_fixed, dtype="int64")
+    den = np.asarray(nominals, dtype="int64") * RATE_SCALE
+    sign = np.sign(amounts)
+    q, r = np.divmod(np.abs(amounts), den)
+    return sign * (q * rates + _round_half_away(r * rates, den))
+
+
+class RateTable:
+    """
+    Курсы всех валют одной котировки ЦБ как векторы: codes[i] -> values[i]
+    (Value с RATE_SCALE знаками) и nominals[i]. RUB — всегда первый, 1:1.
+    Собирается один раз на котировку (см. rates.rate_table) и пересчитывает
+    любые суммы в любых валютах без обращений к сети.
+    """
+
+    def __init__(self, quotes, date=None):
+        import numpy as np
+
+        table = {**quotes, "RUB": (1.0, 1)}
+        self.codes = ["RUB", *sorted(c for c in table if c != "RUB")]
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.values = fixed_rates([table[c][0] for c in self.codes])
+        self.nominals = np.array([table[c][1] for c in self.codes], dtype="int64")
+        self.date = date
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def positions(self, currencies):
+        import numpy as np
+
+        try:
+            return np.fromiter((self.index[c] for c in currencies), dtype="int64", count=len(currencies))
+        except KeyError as e:
+            raise ValueError(f"Нет курса ЦБ для {e.args[0]}") from None
+
+    def kopecks(self, amounts, currencies):
+        """Общая точка пересчёта: суммы в валютах currencies -> int64 копеек, поэлементно."""
+        i = self.positions(currencies)
+        return to_kopecks(to_minor(amounts), self.values[i], self.nominals[i])
+
+    def vector(self, holdings):
+        """{код: сумма} -> плотный вектор сотых долей по self.codes (остальные валюты — 0)."""
+        import numpy as np
+
+        dense = np.zeros(len(self.codes), dtype="int64")
+        np.add.at(dense, self.positions(list(holdings)), to_minor(list(holdings.values())))
+        return dense
+
+    def value(self, holdings):
+        """Стоимость портфеля {код: сумма} в копейках: скалярное произведение на вектор курсов."""
+        return int(to_kopecks(self.vector(holdings), self.values, self.nominals).sum())
+
+    def unit(self, code):
+        """₽ за одну единицу валюты (для журнала и графиков)."""
+        i = self.positions([code])[0]
+        return int(self.values[i]) / RATE_SCALE / int(self.nominals[i])
+
+
+def rub(kopecks):
+    """Копейки (скаляр или массив) -> рубли float."""
+    import numpy as np
+
+    result = np.asarray(kopecks, dtype="int64") / KOPECKS
+    return float(result) if result.ndim == 0 else result
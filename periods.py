@@ -0,0 +1,244 @@
+# ---------------- Календарные месяцы ----------------
+# Периоды — календарные месяцы с устойчивым ключом ISO «2025-07», а не
+# «дата начала + 30 × i» с подписью strftime('%B %Y'): шаг в 30 дней на
+# длинном горизонте пропускает или дублирует месяцы, а %B зависит от локали.
+# Подписи для экрана — из своей таблицы названий, от локали не зависят.
+#
+# MonthIndex — горизонт из horizon месяцев начиная с месяца даты начала;
+# позиция месяца считается арифметикой (год × 12 + месяц), без поиска.
+# Savings — накопления по этому индексу: плотный int64-массив копеек
+# (см. money.py), так что итоги, ряды для графиков и таблица — срезы
+# массива, а не обход словаря по подписям. Месяцы хранилища вне горизонта
+# не теряются: они лежат отдельно и возвращаются при записи.
+#
+# Хранилища по-прежнему получают {ключ: ₽}; старые подписи («July 2025»,
+# «Июль 2025») при чтении переводятся в ключи, и первая же запись
+# переписывает таблицу уже с ключами ISO.
+
+import re
+from datetime import date
+
+from money import rub, to_minor
+
+DEFAULT_HORIZON = 12
+MAX_HORIZON = 1200
+
+MONTH_NAMES = (
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь",
+)
+_LEGACY_NAMES = {
+    **{name.lower(): i for i, name in enumerate(MONTH_NAMES, 1)},
+    **{name.lower(): i for i, name in enumerate((
+        "January", "February", "March", "April", "May", "June",
+        "July", "August", "September", "October", "November", "December",
+    ), 1)},
+}
+_KEY = re.compile(r"^(\d{4})-(\d{2})$")
+_LABEL = re.compile(r"^([^\W\d_]+)\s+(\d{4})$")
+
+
+def month_key(d):
+    """date -> '2025-07'."""
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _ordinal(year, month):
+    return year * 12 + month - 1
+
+
+def _from_ordinal(n):
+    return n // 12, n % 12 + 1
+
+
+def parse_month(value):
+    """Ключ месяца из '2025-07', date или старой подписи ('July 2025', 'Июль 2025'); иначе None."""
+    if isinstance(value, date):
+        return month_key(value)
+    text = str(value).strip()
+    m = _KEY.match(text)
+    if m and 1 <= int(m.group(2)) <= 12:
+        return text
+    m = _LABEL.match(text)
+    if m and m.group(1).lower() in _LEGACY_NAMES:
+        return f"{m.group(2)}-{_LEGACY_NAMES[m.group(1).lower()]:02d}"
+    return None
+
+
+def normalize_months(pairs):
+    """
+    Пары (месяц, ₽) строк хранилища -> {ключ: ₽}: старые подписи переводятся
+    в ключи, строки одного месяца складываются (в копейках); порядок — по
+    первому появлению. Нераспознанное остаётся как есть.
+    """
+    pairs = list(pairs)
+    totals = {}
+    for (month, _), amount in zip(pairs, to_minor([v for _, v in pairs]).tolist()):
+        key = parse_month(month) or str(month)
+        totals[key] = totals.get(key, 0) + amount
+    return dict(zip(totals, rub(list(totals.values())).tolist()))
+
+
+def month_label(key):
+    """'2025-07' -> 'Июль 2025'; нераспознанное показываем как есть."""
+    m = _KEY.match(key)
+    if not m:
+        return key
+    return f"{MONTH_NAMES[int(m.group(2)) - 1]} {m.group(1)}"
+
+
+def add_months(d, months):
+    """Дата через months календарных месяцев; 31-е в коротком месяце -> последний день."""
+    year, month = _from_ordinal(_ordinal(d.year, d.month) + months)
+    next_year, next_month = _from_ordinal(_ordinal(year, month) + 1)
+    last_day = (date(next_year, next_month, 1) - date(year, month, 1)).days
+    return date(year, month, min(d.day, last_day))
+
+
+def shift_months(dates, months):
+    """add_months для колонок: Series дат + Series/массив месяцев -> Series дат."""
+    import pandas as pd
+
+    dates = pd.Series(pd.to_datetime(dates))
+    ordinal = dates.dt.year * 12 + dates.dt.month - 1 + pd.Series(months, index=dates.index)
+    first = pd.to_datetime(pd.DataFrame({"year": ordinal // 12, "month": ordinal % 12 + 1, "day": 1}))
+    day = dates.dt.day.clip(upper=first.dt.days_in_month)
+    return first + pd.to_timedelta(day - 1, unit="D")
+
+
+def to_dates(values):
+    """Колонка дат (импорт, файлы целей): datetime из xlsx, '13.07.2025' или ISO; нераспознанное -> NaT."""
+    import pandas as pd
+
+    col = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    dates = pd.to_datetime(col, format="%d.%m.%Y", errors="coerce")
+    # быстрые форматы — целой колонкой, поэлементный разбор — только для остатка
+    for fmt, dayfirst in (("ISO8601", False), ("mixed", True)):
+        rest = dates.isna() & col.notna()
+        if not rest.any():
+            break
+        dates[rest] = pd.to_datetime(col[rest].astype(str), format=fmt, dayfirst=dayfirst, errors="coerce")
+    return dates
+
+
+class MonthIndex:
+    """horizon календарных месяцев начиная с месяца start."""
+
+    def __init__(self, start, horizon=DEFAULT_HORIZON):
+        self.start = start
+        self.horizon = int(horizon)
+        self._base = _ordinal(start.year, start.month)
+        self.keys = tuple(f"{y:04d}-{m:02d}" for y, m in map(_from_ordinal, range(self._base, self._base + self.horizon)))
+        self.labels = tuple(month_label(k) for k in self.keys)
+
+    def __len__(self):
+        return self.horizon
+
+    def __eq__(self, other):
+        return isinstance(other, MonthIndex) and (self._base, self.horizon) == (other._base, other.horizon)
+
+    def __hash__(self):
+        return hash((self._base, self.horizon))
+
+    def position(self, key):
+        """Номер месяца в индексе или None, если ключ вне горизонта / не месяц."""
+        m = _KEY.match(key or "")
+        if not m:
+            return None
+        i = _ordinal(int(m.group(1)), int(m.group(2))) - self._base
+        return i if 0 <= i < self.horizon else None
+
+    def month_starts(self):
+        """1-е число каждого месяца — для осей графиков, где точки должны стоять через равные месяцы."""
+        return [date(*_from_ordinal(self._base + i), 1) for i in range(self.horizon)]
+
+    def dates(self):
+        """Дата каждого периода: для первого — сама дата начала, дальше — 1-е число месяца."""
+        return [self.start] + self.month_starts()[1:]
+
+
+class Savings:
+    """Накопления по месяцам MonthIndex: kopecks[i] — копейки за index.keys[i]."""
+
+    def __init__(self, index, kopecks=None, extra=None):
+        import numpy as np
+
+        self.index = index
+        self.kopecks = np.zeros(len(index), dtype="int64") if kopecks is None else kopecks
+        self.extra = dict(extra or {})  # {ключ: копейки} — месяцы хранилища вне горизонта
+
+    @classmethod
+    def from_dict(cls, index, data):
+        """{месяц: ₽} из хранилища (ключи или старые подписи) -> Savings; суммы — одним векторным разбором."""
+        import numpy as np
+
+        months = list(data)
+        amounts = to_minor(list(data.values()))
+        kopecks = np.zeros(len(index), dtype="int64")
+        extra = {}
+        for month, amount in zip(months, amounts.tolist()):
+            key = parse_month(month) or str(month)
+            i = index.position(key)
+            if i is not None:
+                kopecks[i] += amount
+            else:  # и пустые: это строки хранилища, раскладку при записи не меняем
+                extra[key] = extra.get(key, 0) + amount
+        return cls(index, kopecks, extra)
+
+    def reindex(self, index):
+        """Те же накопления на другом горизонте (смена даты начала или числа месяцев)."""
+        moved = Savings(index)
+        for key, amount in zip(self.index.keys, self.kopecks.tolist()):
+            if amount:
+                moved.add(key, amount)
+        for key, amount in self.extra.items():
+            moved.add(key, amount)
+        return moved
+
+    def to_dict(self):
+        """{ключ: ₽} в календарном порядке — то, что пишется в хранилище."""
+        merged = dict(zip(self.index.keys, rub(self.kopecks).tolist()))
+        merged.update((k, rub(v)) for k, v in self.extra.items())
+        return dict(sorted(merged.items()))
+
+    def get(self, key):
+        i = self.index.position(key)
+        return int(self.kopecks[i]) if i is not None else self.extra.get(key, 0)
+
+    def add(self, key, kopecks):
+        i = self.index.position(key)
+        if i is None:
+            self.extra[key] = self.extra.get(key, 0) + int(kopecks)
+        else:
+            self.kopecks[i] += int(kopecks)
+
+    def total(self):
+        """Все накопления в копейках, включая месяцы вне горизонта."""
+        return int(self.kopecks.sum()) + sum(self.extra.values())
+
+    def series(self):
+        """₽ по месяцам индекса — для графиков и таблицы."""
+        return rub(self.kopecks)
+
+    def nonzero(self):
+        """(подписи, ₽) месяцев с ненулевой суммой — для круговой диаграммы."""
+        import numpy as np
+
+        idx = np.flatnonzero(self.kopecks)
+        labels = [self.index.labels[i] for i in idx.tolist()]
+        values = rub(self.kopecks[idx]).tolist()
+        for key, v in sorted(self.extra.items()):
+            if v:
+                labels.append(month_label(key))
+                values.append(rub(v))
+        return labels, values
+
+    def items(self):
+        """(ключ, ₽) месяцев с ненулевой суммой."""
+        return [(k, v) for k, v in self.to_dict().items() if v]
+
+    def cleared(self):
+        """Пустые накопления на том же горизонте (сброс)."""
+        return Savings(self.index)
@@ -0,0 +1,168 @@
+# ---------------- Прогресс по цели ----------------
+# Чистое ядро расчёта «накоплено / осталось / когда закончим» без Streamlit
+# и session_state: приложения вызывают goal_progress() для своей одной цели,
+# отчёты — progress_table() сразу для тысяч целей. Табличный расчёт идёт
+# колонками (pandas/NumPy) в целых копейках, валюты пересчитываются по
+# одной котировке ЦБ (money.RateTable), без цикла по целям. what_if_grid()
+# тем же расчётом отвечает на «что если» для одной цели: сразу по сетке
+# планов × курсов валют, одной broadcast-операцией NumPy.
+#
+# Файл целей — CSV или JSON. В CSV по строке на цель: goal, plan,
+# start_date, необязательные name и saved (уже внесено, ₽) и по колонке на
+# валюту накоплений (USD, UZS, RUB, ...). В JSON — список объектов с теми
+# же полями, валюты — во вложенном объекте holdings:
+#
+#     [{"name": "Квартира", "goal": 4498000, "plan": 271634,
+#       "start_date": "2025-07-13", "holdings": {"USD": 12000, "UZS": 51000000}}]
+#
+#     python progress.py goals.csv -o report.csv
+#     python progress.py goals.json -o report.json
+
+import argparse
+import json
+import re
+import sys
+
+from money import rub, to_kopecks, to_minor
+from periods import add_months, shift_months, to_dates
+
+REPORT_COLUMNS = [
+    "name", "goal", "plan", "start_date", "start_capital", "accumulated",
+    "remaining", "percent", "months_left", "finish_date",
+]
+_CODE = re.compile(r"^[A-Z]{3}$")
+
+
+def goal_progress(goal, start_capital, saved, monthly_plan, start_date):
+    """
+    Одна цель, суммы в ₽. Возвращает (накоплено, осталось, оценочная дата
+    завершения, % выполнения); дата — через остаток / план календарных месяцев.
+    """
+    accumulated = start_capital + saved
+    remaining = max(0, goal - accumulated)
+    months_left = int(remaining / monthly_plan) if monthly_plan else 1
+    percent = accumulated / goal * 100 if goal else 0
+    return accumulated, remaining, add_months(start_date, months_left), percent
+
+
+def read_goals(path):
+    """Файл целей (.csv или .json) -> DataFrame: служебные колонки + колонка на каждую валюту."""
+    import pandas as pd
+
+    if str(path).lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        goals = pd.json_normalize(doc.get("goals", []) if isinstance(doc, dict) else doc)
+        goals.columns = [c.removeprefix("holdings.") for c in goals.columns]
+    else:
+        goals = pd.read_csv(path, sep=None, engine="python", dtype=str, encoding="utf-8-sig")
+    missing = {"goal", "plan", "start_date"} - set(goals.columns)
+    if missing:
+        raise ValueError(f"В файле целей нет колонок: {', '.join(sorted(missing))}")
+    if "name" not in goals:
+        goals["name"] = [str(i) for i in range(1, len(goals) + 1)]
+    return goals
+
+
+def currency_columns(goals):
+    return [c for c in goals.columns if _CODE.match(str(c))]
+
+
+def progress_table(goals, table):
+    """
+    Прогресс по каждой цели из read_goals: одна колонка — одна векторная
+    операция. table — money.RateTable; валюта без курса ЦБ -> ValueError.
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = len(goals)
+    start_kopecks = np.zeros(n, dtype="int64")
+    for code in currency_columns(goals):
+        start_kopecks += table.kopecks(goals[code].fillna(0), [code] * n)
+    goal = to_minor(goals["goal"])
+    plan = to_minor(goals["plan"])
+    saved = to_minor(goals["saved"]) if "saved" in goals else np.zeros(n, dtype="int64")
+    start_date = to_dates(goals["start_date"]).dt.normalize()
+
+    accumulated = start_kopecks + saved
+    remaining = np.clip(goal - accumulated, 0, None)
+    # как в goal_progress: целых месяцев по плану, без плана — один месяц
+    months_left = np.where(plan > 0, remaining // np.where(plan > 0, plan, 1), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.where(goal != 0, accumulated / np.where(goal != 0, goal, 1) * 100, 0.0)
+
+    report = pd.DataFrame({
+        "name": goals["name"].to_numpy(),
+        "goal": rub(goal),
+        "plan": rub(plan),
+        "start_date": start_date.dt.date,
+        "start_capital": rub(start_kopecks),
+        "accumulated": rub(accumulated),
+        "remaining": rub(remaining),
+        "percent": np.round(percent, 2),
+        "months_left": months_left,
+        "finish_date": shift_months(start_date, months_left).dt.date,
+    })
+    return report[REPORT_COLUMNS]
+
+
+def what_if_grid(goal, saved, holdings, table, plans, shocks, months_ahead):
+    """
+    Сетка «что если» для одной цели. goal, saved и вектор plans — копейки;
+    shocks — {код: множители текущего курса ЦБ}, по оси сетки на валюту в
+    порядке словаря; прочие валюты holdings — по текущему курсу.
+    Возвращает (months_left, shortfall) формы (len(plans), *длины множителей):
+    месяцев до цели, как в goal_progress, и недостачу в копейках после
+    months_ahead месяцев по плану.
+    """
+    import numpy as np
+
+    ndim = 1 + len(shocks)
+    start = np.int64(table.value({c: a for c, a in holdings.items() if c not in shocks}))
+    for axis, (code, factors) in enumerate(shocks.items(), 1):
+        i = table.positions([code])[0]
+        rates = np.round(table.values[i] * np.asarray(factors, dtype="float64")).astype("int64")
+        by_rate = to_kopecks(to_minor([holdings.get(code, 0.0)]), rates, table.nominals[i])
+        start = start + by_rate.reshape([-1 if a == axis else 1 for a in range(ndim)])
+    plan = np.asarray(plans, dtype="int64").reshape([-1] + [1] * (ndim - 1))
+
+    remaining = np.clip(goal - (start + saved), 0, None)
+    months_left = np.where(plan > 0, remaining // np.where(plan > 0, plan, 1), 1)
+    shortfall = np.clip(remaining - plan * months_ahead, 0, None)
+    return months_left, shortfall
+
+
+def write_report(report, path=None):
+    """CSV (по умолчанию, в т.ч. в stdout) или JSON — по расширению path."""
+    if path and str(path).lower().endswith(".json"):
+        dates = {"start_date": str, "finish_date": str}  # '2025-07-13', а не метка времени
+        report.astype(dates).to_json(path, orient="records", force_ascii=False, indent=1)
+    else:
+        report.to_csv(path if path else sys.stdout, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёт о прогрессе по файлу целей, без запуска сервера")
+    parser.add_argument("path", help="файл целей: .csv или .json")
+    parser.add_argument("-o", "--output", help="куда писать отчёт: .csv или .json (по умолчанию CSV в stdout)")
+    args = parser.parse_args()
+
+    from rates import fetch_exchange_rates, rate_table
+
+    try:
+        goals = read_goals(args.path)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    fetch_exchange_rates()  # пустую базу курсов заполнит синхронно
+    try:
+        report = progress_table(goals, rate_table())
+    except ValueError as e:
+        parser.error(str(e))
+    write_report(report, args.output)
+    if args.output:
+        print(f"Целей: {len(report)}, отчёт: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# ---------------- Прогноз даты завершения (Монте-Карло) ----------------
+# Вместо одной даты «остаток / план × 30 дней» разыгрываем тысячи сценариев:
+# ежемесячные взносы и месячные движения курсов валют портфеля→₽. Всё считается
+# массивами (пути × месяцы) без циклов Python, 10k путей на 60 месяцев —
+# десятки миллисекунд.
+#
+# Сид фиксирован, так что на одних и тех же входах результат один и тот же:
+# rate_moments и forecast берут его из LRU-кэша процесса (как фигуры в
+# charts.py), и перезапуск скрипта без новых данных не разыгрывает пути
+# заново. Аргументы — хэшируемые (кортежи, числа, даты); возвращаемые
+# массивы общие — менять их на месте нельзя.
+
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from tracing import traced
+
+PERCENTILES = (10, 50, 90)
+CACHE_SIZE = 16
+
+
+def calibrate_rates(history, codes):
+    """
+    Среднее и ковариация месячных лог-доходностей курсов codes по истории
+    DataFrame(date, currency, rate). Если истории мало — курсы считаем постоянными.
+    """
+    k = len(codes)
+    if not k or history.empty:
+        return np.zeros(k), np.zeros((k, k))
+    prices = history.pivot_table(index="date", columns="currency", values="rate", aggfunc="last")
+    prices = prices.reindex(columns=codes).resample("ME").last().dropna()
+    returns = np.diff(np.log(prices.to_numpy()), axis=0)
+    if len(returns) < 3:
+        return np.zeros(k), np.zeros((k, k))
+    return returns.mean(axis=0), np.atleast_2d(np.cov(returns, rowvar=False))
+
+
+def calibrate_contributions(monthly_totals, monthly_plan):
+    """Среднее и разброс взноса за месяц по прошлым месяцам; пока их меньше двух — от плана."""
+    past = np.asarray([v for v in monthly_totals if v > 0], dtype=float)
+    if len(past) < 2:
+        return float(monthly_plan), 0.25 * float(monthly_plan)
+    return past.mean(), past.std(ddof=1)
+
+
+def simulate(goal, rub_saved, holdings, spot, mu, cov, contrib_mean, contrib_std,
+             months=60, paths=10_000, seed=0):
+    """
+    Разыгрывает paths сценариев на months месяцев вперёд.
+
+    holdings — количество валюты (вектор по codes), spot — текущий курс ₽ за единицу.
+    Возвращает (totals, finish): стоимость накоплений в ₽ формы (paths, months)
+    и номер месяца достижения цели (1..months) или months + 1, если не успели.
+    """
+    rng = np.random.default_rng(seed)
+    holdings = np.asarray(holdings, dtype=float)
+    spot = np.asarray(spot, dtype=float)
+
+    # Курсы: геометрическое блуждание с коррелированными шагами
+    if len(spot):
+        steps = rng.multivariate_normal(mu, cov, size=(paths, months), method="eigh")
+        rates = spot * np.exp(np.cumsum(steps, axis=1))        # (paths, months, k)
+    else:
+        rates = np.zeros((paths, months, 0))                   # портфель только в рублях
+
+    contributions = np.clip(rng.normal(contrib_mean, contrib_std, size=(paths, months)), 0.0, None)
+    totals = rub_saved + np.cumsum(contributions, axis=1) + rates @ holdings
+
+    reached = totals >= goal
+    finish = np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, months + 1)
+    return totals, finish
+
+
+def finish_dates(finish, months, today=None):
+    """P10/P50/P90 даты завершения; None — если цель не достигается за горизонт."""
+    today = today or date.today()
+    result = {}
+    for p, m in zip(PERCENTILES, np.percentile(finish, PERCENTILES, method="higher")):
+        result[p] = None if m > months else (pd.Timestamp(today) + pd.DateOffset(months=int(m))).date()
+    return result
+
+
+def fan(totals):
+    """Полосы для веерной диаграммы: перцентили стоимости по месяцам, форма (3, months)."""
+    return np.percentile(totals, PERCENTILES, axis=0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rate_moments(codes, start, end, revision):
+    """
+    calibrate_rates по истории курсов codes из базы за [start, end] -> (mu, cov)
+    кортежами. revision — rates.revision(): пока новых котировок нет, история
+    из базы не перечитывается.
+    """
+    from rates import history
+
+    mu, cov = calibrate_rates(history(list(codes), start, end), list(codes))
+    return tuple(mu.tolist()), tuple(map(tuple, cov.tolist()))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+@traced("simulate")
+def forecast(goal, rub_saved, holdings, spot, mu, cov, monthly_totals, monthly_plan, months, today):
+    """
+    calibrate_contributions + simulate + finish_dates + fan одним вызовом на
+    хэшируемых входах (holdings, spot, mu, cov, monthly_totals — кортежи).
+    Возвращает (даты P10/P50/P90, полосы fan).
+    """
+    contrib_mean, contrib_std = calibrate_contributions(monthly_totals, monthly_plan)
+    totals, finish = simulate(
+        goal, rub_saved, holdings, spot, np.asarray(mu), np.asarray(cov).reshape(len(mu), len(mu)),
+        contrib_mean, contrib_std, months=months,
+    )
+    return finish_dates(finish, months, today), fan(totals)
@@ -0,0 +1,257 @@
+# ---------------- Курсы валют ЦБ РФ ----------------
+# Каждая полученная дневная котировка (Value, Previous, Date) по каждой валюте
+# ложится в локальную SQLite-базу. Дашборд читает курсы из неё сразу, а
+# свежие данные подтягиваются фоновым потоком (stale-while-revalidate).
+# Если ЦБ недоступен — работаем на последних известных курсах.
+
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from contextlib import closing
+from datetime import timedelta
+
+import requests
+
+from tracing import on_response, traced
+
+CBR_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
+# Динамика курса одной валюты за период — одним запросом (для истории)
+CBR_DYNAMIC_URL = "https://www.cbr.ru/scripts/XML_dynamic.asp"
+RATES_DB = os.environ.get(
+    "RATES_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rates.sqlite3")
+)
+REFRESH_INTERVAL = 3600  # с какого возраста (сек) данные считаем устаревшими
+REQUEST_TIMEOUT = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    code       TEXT    NOT NULL,
+    date       TEXT    NOT NULL,
+    nominal    INTEGER NOT NULL,
+    value      REAL    NOT NULL,
+    previous   REAL,
+    fetched_at REAL    NOT NULL,
+    PRIMARY KEY (code, date)
+);
+CREATE TABLE IF NOT EXISTS currencies (
+    code   TEXT PRIMARY KEY,
+    cbr_id TEXT NOT NULL,
+    name   TEXT
+)
+"""
+
+_refresh_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(RATES_DB, timeout=5)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def refresh():
+    """Забирает daily_json у ЦБ и сохраняет котировки всех валют. True — если удалось."""
+    try:
+        r = requests.get(CBR_URL, timeout=REQUEST_TIMEOUT, hooks={"response": on_response})
+        r.raise_for_status()
+        d = r.json()
+        day = d["Date"]
+        now = time.time()
+        rows = [
+            (code, day, v.get("Nominal", 1), v["Value"], v.get("Previous"), now)
+            for code, v in d["Valute"].items()
+        ]
+        ids = [(code, v["ID"], v.get("Name")) for code, v in d["Valute"].items() if "ID" in v]
+    except Exception:
+        return False
+    with closing(_connect()) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO quotes (code, date, nominal, value, previous, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.executemany("INSERT OR REPLACE INTO currencies (code, cbr_id, name) VALUES (?, ?, ?)", ids)
+    return True
+
+
+def _refresh_in_background():
+    # Не больше одного фонового запроса к ЦБ на процесс
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            refresh()
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name="cbr-refresh", daemon=True).start()
+
+
+def _last_fetched_at():
+    with closing(_connect()) as conn:
+        return conn.execute("SELECT MAX(fetched_at) FROM quotes").fetchone()[0]
+
+
+def revision():
+    """Метка версии базы котировок: меняется с каждой новой котировкой (для кэшей по истории)."""
+    return _last_fetched_at()
+
+
+def latest(code):
+    """(value, previous, date) последней сохранённой котировки или (None, None, None)."""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT value, previous, date FROM quotes WHERE code = ? ORDER BY date DESC LIMIT 1",
+            (code,),
+        ).fetchone()
+    return row if row else (None, None, None)
+
+
+def quotes(codes=None):
+    """{код: (Value, Nominal)} последних котировок по codes (None — все валюты ЦБ)."""
+    where, params = "", []
+    if codes is not None:
+        where, params = f"WHERE code IN ({','.join('?' * len(codes))})", list(codes)
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            f"SELECT code, value, nominal, MAX(date) FROM quotes {where} GROUP BY code", params
+        ).fetchall()
+    return {code: (value, nominal) for code, value, nominal, _ in rows}
+
+
+_table = (None, None)  # (fetched_at, RateTable)
+
+
+def rate_table():
+    """
+    money.RateTable по последним котировкам всех валют ЦБ. Собирается из
+    одного чтения базы и переиспользуется, пока не пришла новая котировка.
+    """
+    global _table
+    from money import RateTable
+
+    fetched_at = _last_fetched_at()
+    if _table[0] != fetched_at or _table[1] is None:
+        with closing(_connect()) as conn:
+            day = conn.execute("SELECT MAX(date) FROM quotes").fetchone()[0]
+        _table = (fetched_at, RateTable(quotes(), day))
+    return _table[1]
+
+
+@traced("fetch_exchange_rates")
+def fetch_exchange_rates():
+    """
+    Возвращает:
+      usd, usd_prev — текущий и вчерашний курс USD→₽
+      uzs, uzs_prev — текущий и вчерашний Value для UZS (как отдаёт ЦБ)
+      ts            — дата котировки ЦБ
+    Отдаёт сохранённое сразу; если оно устарело — обновляет в фоне.
+    Ждём ЦБ синхронно только когда база ещё пустая.
+    """
+    fetched_at = _last_fetched_at()
+    if fetched_at is None:
+        refresh()
+    elif time.time() - fetched_at > REFRESH_INTERVAL:
+        _refresh_in_background()
+
+    usd, usd_prev, ts = latest("USD")
+    uzs, uzs_prev, _ = latest("UZS")
+    return usd, usd_prev, uzs, uzs_prev, ts
+
+
+# ---------------- История курсов ----------------
+def _day_key(d):
+    # Тот же вид, что и Date в daily_json — чтобы строки сортировались вместе
+    return f"{d:%Y-%m-%d}T11:30:00+03:00"
+
+
+def backfill(code, start, end):
+    """Догружает дневные курсы code за [start, end] одним запросом XML_dynamic."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT cbr_id FROM currencies WHERE code = ?", (code,)).fetchone()
+    if row is None:
+        return False
+    try:
+        r = requests.get(
+            CBR_DYNAMIC_URL,
+            params={
+                "date_req1": f"{start:%d/%m/%Y}",
+                "date_req2": f"{end:%d/%m/%Y}",
+                "VAL_NM_RQ": row[0],
+            },
+            timeout=REQUEST_TIMEOUT,
+            hooks={"response": on_response},
+        )
+        r.raise_for_status()
+        records = ET.fromstring(r.content).findall("Record")
+    except Exception:
+        return False
+
+    now = time.time()
+    rows, prev = [], None
+    for rec in records:
+        d, m, y = rec.get("Date").split(".")
+        value = float(rec.findtext("Value").replace(",", "."))
+        nominal = int(rec.findtext("Nominal"))
+        rows.append((code, f"{y}-{m}-{d}T11:30:00+03:00", nominal, value, prev, now))
+        prev = value
+    with closing(_connect()) as conn, conn:
+        # Котировки из daily_json (с настоящим Previous) не перетираем
+        conn.executemany(
+            "INSERT OR IGNORE INTO quotes (code, date, nominal, value, previous, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return True
+
+
+_backfill_lock = threading.Lock()
+_backfill_tried = set()  # (code, start) — за процесс догружаем каждый период один раз
+
+
+def ensure_history(codes, start, end):
+    """Если в базе нет курсов с самого start — догружает их фоновым потоком."""
+    # Неделя запаса: start может прийтись на выходные, когда котировок нет
+    first_needed = _day_key(start + timedelta(days=7))
+    with closing(_connect()) as conn:
+        missing = [
+            code for code in codes
+            if (code, start) not in _backfill_tried
+            and (conn.execute("SELECT MIN(date) FROM quotes WHERE code = ?", (code,)).fetchone()[0] or "9999")
+            > first_needed
+        ]
+    if not missing or not _backfill_lock.acquire(blocking=False):
+        return
+    _backfill_tried.update((code, start) for code in missing)
+
+    def run():
+        try:
+            for code in missing:
+                backfill(code, start, end)
+        finally:
+            _backfill_lock.release()
+
+    threading.Thread(target=run, name="cbr-backfill", daemon=True).start()
+
+
+def history(codes, start, end):
+    """
+    DataFrame(currency, date, value, nominal, rate): котировки ЦБ по дням,
+    rate — ₽ за 1 единицу валюты.
+    Захватываем пару недель до start, чтобы было чем заполнить выходные.
+    """
+    import pandas as pd
+
+    placeholders = ",".join("?" * len(codes))
+    with closing(_connect()) as conn:
+        df = pd.read_sql_query(
+            f"SELECT code AS currency, date, value, nominal, value * 1.0 / nominal AS rate FROM quotes "
+            f"WHERE code IN ({placeholders}) AND date >= ? AND date <= ? ORDER BY date",
+            conn,
+            params=[*codes, _day_key(start - timedelta(days=14)), _day_key(end)],
+        )
+    df["date"] = pd.to_datetime(df["date"].str[:10])
+    return df
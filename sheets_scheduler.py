@@ -0,0 +1,222 @@
+# ---------------- Планировщик запросов к Google Sheets API ----------------
+# Весь трафик gspread из процесса (все сессии, фоновые StoreWriter'ы) идёт
+# через один SheetsScheduler:
+#   • token bucket на чтение и на запись под поминутную квоту API — лишний
+#     запрос ждёт токен, а не получает 429;
+#   • одинаковые чтения, уже летящие в API, не дублируются — второй
+#     вызывающий ждёт ответ первого;
+#   • batch_update и append_rows к одному листу, пришедшие, пока предыдущий
+#     такой запрос ещё летит, уходят следующим одним запросом;
+#   • 429 и 5xx повторяются с экспоненциальной задержкой и полным джиттером
+#     (5xx — только для идемпотентных вызовов: append мог и пройти).
+# Счётчики (очередь, ожидания квоты, повторы, склейки) — в stats(), их
+# показывает дашборд рядом со статусом записи.
+#
+# Квоты по умолчанию — 60 чтений и 60 записей в минуту (лимит Sheets API
+# на пользователя); переопределяются SHEETS_READS_PER_MINUTE /
+# SHEETS_WRITES_PER_MINUTE.
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from tracing import phase
+
+READS_PER_MINUTE = int(os.environ.get("SHEETS_READS_PER_MINUTE", 60))
+WRITES_PER_MINUTE = int(os.environ.get("SHEETS_WRITES_PER_MINUTE", 60))
+BURST = 10            # сколько запросов можно отправить подряд без ожидания
+MAX_RETRIES = 6
+BASE_DELAY = 1.0      # сек, первая пауза перед повтором (дальше ×2, не больше MAX_DELAY)
+MAX_DELAY = 32.0
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+WRITE_METHODS = {
+    "update", "batch_update", "clear", "batch_clear", "append_row", "append_rows",
+    "add_worksheet", "delete_rows", "insert_rows",
+}
+NOT_IDEMPOTENT = {"append_row", "append_rows", "add_worksheet", "insert_rows"}
+MERGEABLE = {"batch_update", "append_rows"}  # первый аргумент — список, списки склеиваются
+
+
+def status_of(e):
+    """HTTP-статус ответа из gspread.exceptions.APIError (или None)."""
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+
+class TokenBucket:
+    """per_minute токенов в минуту равномерно, не больше burst про запас."""
+
+    def __init__(self, per_minute, burst=BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = float(min(burst, per_minute))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Забирает токен; возвращает, сколько секунд пришлось ждать."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                pause = (1 - self.tokens) / self.rate
+            time.sleep(pause)
+            waited += pause
+
+
+class SheetsScheduler:
+    def __init__(self, reads_per_minute=READS_PER_MINUTE, writes_per_minute=WRITES_PER_MINUTE,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.buckets = {"read": TokenBucket(reads_per_minute), "write": TokenBucket(writes_per_minute)}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._reads = {}    # ключ чтения -> Future летящего запроса
+        self._groups = {}   # (лист, метод, kwargs) -> {"busy", "pending": [(список, Future)]}
+        self._stats = {
+            "queued": 0,         # вызовов сейчас ждут токен / повтор / склейку
+            "requests": 0,       # ушло в API (с повторами)
+            "throttled": 0,      # раз ждали токен квоты
+            "throttled_s": 0.0,  # и сколько секунд в сумме
+            "retried": 0,        # повторов после 429/5xx
+            "coalesced": 0,      # чтений, отданных из чужого летящего запроса
+            "merged": 0,         # записей, уехавших в чужом batch-запросе
+            "last_throttle": None,  # time.time() последнего ожидания или 429
+        }
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, d in deltas.items():
+                self._stats[name] += d
+
+    def run(self, kind, fn, idempotent=True):
+        """Вызов fn() под квотой kind ('read'/'write') с повторами на 429/5xx."""
+        self._count(queued=1)
+        try:
+            for attempt in range(self.max_retries + 1):
+                waited = self.buckets[kind].acquire()
+                if waited:
+                    self._count(throttled=1, throttled_s=waited)
+                    with self._lock:
+                        self._stats["last_throttle"] = time.time()
+                try:
+                    self._count(requests=1)
+                    return fn()
+                except Exception as e:
+                    status = status_of(e)
+                    retry = status == 429 or (idempotent and status in RETRY_STATUSES)
+                    if not retry or attempt == self.max_retries:
+                        raise
+                    with self._lock:
+                        self._stats["retried"] += 1
+                        self._stats["last_throttle"] = time.time()
+                    # полный джиттер: сессии, упёршиеся в квоту вместе, повторяют вразнобой
+                    with phase("sheets_backoff"):
+                        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+        finally:
+            self._count(queued=-1)
+
+    def call(self, handle, name, args, kwargs, invoke):
+        """Метод name листа handle; invoke(name, args, kwargs) — сам вызов gspread."""
+        if name in MERGEABLE and len(args) == 1 and isinstance(args[0], list):
+            return self._merged(handle, name, args[0], kwargs, invoke)
+        if name in WRITE_METHODS:
+            return self.run("write", lambda: invoke(name, args, kwargs), idempotent=name not in NOT_IDEMPOTENT)
+        return self._read(handle, name, args, kwargs, invoke)
+
+    def _read(self, handle, name, args, kwargs, invoke):
+        key = (handle.spreadsheet_id, handle.title, name, repr(args), repr(sorted(kwargs.items())))
+        with self._lock:
+            inflight = self._reads.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._reads[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            return inflight.result()
+        try:
+            result = self.run("read", lambda: invoke(name, args, kwargs))
+        except Exception as e:
+            inflight.set_exception(e)
+            raise
+        else:
+            inflight.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._reads[key]
+
+    def _merged(self, handle, name, items, kwargs, invoke):
+        # Пока такая запись к листу летит, новые копятся в pending и уходят
+        # следующим одним запросом. Отправляет «лидер»: первый пришедший, а
+        # после него — первый из ждавших. Порядок сохраняется, так что поздняя
+        # запись той же ячейки по-прежнему побеждает. Без конкуренции —
+        # обычный одиночный запрос, без лишних задержек.
+        key = (handle.spreadsheet_id, handle.title, name, repr(sorted(kwargs.items())))
+        mine = Future()
+        with self._lock:
+            slot = self._groups.setdefault(key, {"busy": False, "pending": []})
+            slot["pending"].append((items, mine))
+            lead = not slot["busy"]
+            slot["busy"] = True
+        if not lead:
+            kind, value = mine.result()
+            if kind == "done":
+                return value
+            if kind == "error":
+                raise value
+            # kind == "lead": наши данные ещё в pending — отправляем их сами
+
+        with self._lock:
+            batch, slot["pending"] = slot["pending"], []
+            self._stats["merged"] += len(batch) - 1
+        payload = [item for chunk, _ in batch for item in chunk]
+        try:
+            outcome = ("done", self.run(
+                "write", lambda: invoke(name, (payload,), kwargs), idempotent=name not in NOT_IDEMPOTENT
+            ))
+        except Exception as e:
+            outcome = ("error", e)
+        with self._lock:
+            successor = slot["pending"][0][1] if slot["pending"] else None
+            if successor is None:
+                del self._groups[key]
+        for _, f in batch:
+            if not f.done():
+                f.set_result(outcome)
+        if successor is not None:
+            successor.set_result(("lead", None))
+        if outcome[0] == "error":
+            raise outcome[1]
+        return outcome[1]
+
+scheduler = SheetsScheduler()
+
+
+def status_line():
+    """Строка для дашборда: очередь, квота и повторы; None — если к API ещё не обращались."""
+    s = scheduler.stats()
+    if not s["requests"]:
+        return None
+    line = (
+        f"Sheets API: в очереди {s['queued']} · запросов {s['requests']} · "
+        f"ожиданий квоты {s['throttled']} ({s['throttled_s']:.1f} с) · повторов после 429/5xx {s['retried']} · "
+        f"склеено чтений {s['coalesced']}, записей {s['merged']}"
+    )
+    if s["last_throttle"]:
+        line += f" · последнее ограничение {time.strftime('%H:%M:%S', time.localtime(s['last_throttle']))}"
+    return line
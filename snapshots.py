@@ -0,0 +1,75 @@
+# ---------------- Локальный снимок итогов таблицы ----------------
+# Последнее известное состояние листа итогов лежит на диске колонками
+# Arrow IPC (месяц, копейки) с ревизией листа в метаданных — по файлу на
+# таблицу. Новый процесс (перезапуск воркера) не читает лист целиком:
+# снимок берётся с диска, а у таблицы спрашиваются только ревизия и строки,
+# изменённые после неё (см. storage.load_savings). Хранилища отдают
+# {месяц: ₽}, поэтому колонки сразу собираются в dict: выигрыш — в
+# несделанных запросах к API, а не в разборе файла.
+#
+# pyarrow импортируется при первом обращении; если его нет или файл
+# битый — снимка просто нет, и лист читается целиком, как раньше.
+#
+# Правки листа руками ревизию не меняют, поэтому снимок старше MAX_AGE
+# не используется: лист один раз читается целиком и снимок обновляется.
+#
+# SAVINGS_SNAPSHOT_DIR     — каталог снимков (по умолчанию .snapshots рядом с кодом)
+# SAVINGS_SNAPSHOT_MAX_AGE — сколько секунд снимку можно верить (по умолчанию сутки)
+
+import os
+import threading
+import time
+
+SNAPSHOT_DIR = os.environ.get(
+    "SAVINGS_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+)
+MAX_AGE = int(os.environ.get("SAVINGS_SNAPSHOT_MAX_AGE", 24 * 3600))
+
+
+def path_for(spreadsheet_id):
+    return os.path.join(SNAPSHOT_DIR, f"{spreadsheet_id}.arrow")
+
+
+def read(spreadsheet_id):
+    """({месяц: ₽} в порядке строк листа, ревизия) из снимка или None (нет, битый, устарел)."""
+    from money import rub
+
+    path = path_for(spreadsheet_id)
+    try:
+        if time.time() - os.path.getmtime(path) > MAX_AGE:
+            return None
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            revision = int(table.schema.metadata[b"revision"])
+            months = table.column("month").to_pylist()
+            # копейки -> ₽ одним векторным проходом
+            sums = rub(table.column("kopecks").to_numpy()).tolist()
+    except (ImportError, OSError, KeyError, ValueError, TypeError):  # ошибки Arrow — их подклассы
+        return None
+    return dict(zip(months, sums)), revision
+
+
+def write(spreadsheet_id, data, revision):
+    """Атомарно записывает снимок {месяц: ₽} с ревизией листа; без pyarrow — ничего не делает."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+    from money import to_minor
+
+    table = pa.table(
+        {"month": pa.array(list(data), pa.string()), "kopecks": pa.array(to_minor(list(data.values())), pa.int64())},
+        metadata={"revision": str(revision)},
+    )
+    path = path_for(spreadsheet_id)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        # без сжатия: только такой файл читается отображением в память без распаковки
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # снимок — только ускорение; не записали — в следующий раз прочитаем лист
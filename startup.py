@@ -0,0 +1,42 @@
+# ---------------- Параллельный холодный старт ----------------
+# Авторизация в Sheets + чтение накоплений и загрузка курсов друг от друга не
+# зависят: запускаем их одновременно в общем пуле процесса, а скрипт ждёт
+# каждую задачу со своим таймаутом и рисует то, что уже готово. Время до
+# первого экрана — самый медленный из вызовов, а не их сумма.
+#
+# У каждой задачи своя трасса: фазы и HTTP-запросы, сделанные в пуле,
+# попадают в трассу перезапуска, который задачу дождался.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import Trace, attached, merge_trace, phase
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="startup")
+
+
+def start(fn, *args):
+    """Запускает fn(*args) в пуле; результат забирается через wait()."""
+    trace = Trace()
+
+    def run():
+        with attached(trace):
+            return fn(*args)
+
+    future = _pool.submit(run)
+    future.trace = trace
+    return future
+
+
+def wait(future, name, timeout):
+    """
+    Ждёт задачу не дольше timeout секунд (иначе concurrent.futures.TimeoutError,
+    задача при этом продолжает работать). Исключение задачи пробрасывается.
+    Время ожидания попадает в трассу как фаза name, а когда задача
+    завершилась — и её собственные фазы.
+    """
+    try:
+        with phase(name):
+            return future.result(timeout=timeout)
+    finally:
+        if future.done():
+            merge_trace(future.trace)
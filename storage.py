@@ -0,0 +1,565 @@
+# ---------------- Хранение накоплений в Google Sheets ----------------
+# Первый лист: A1:B1 — заголовок, C1:D1 — «Ревизия» и её номер, дальше по
+# строке на месяц: месяц, сумма и ревизия, на которой строка менялась
+# последний раз. Это материализованные итоги: каждое пополнение меняет
+# одну ячейку (+=). Лист «Журнал» — append-only лог: строка на каждую
+# внесённую сумму.
+#
+# Снимок synced (Snapshot) — {месяц: значение} ровно в том порядке строк,
+# что лежит в таблице после последнего load/save, и ревизия, с которой он
+# снят. По нему save_savings понимает, какие ячейки поменяла эта сессия
+# (дельта data − synced), и пишет только их.
+#
+# Запись версионная (оптимистичная): каждая запись увеличивает ревизию.
+# Если ревизия листа ушла вперёд от снимка, значит, его успели поменять
+# другие сессии или процессы — тогда перечитываются только наши строки, и
+# дельта ложится поверх свежих значений. Одновременные пополнения
+# складываются, а не затирают друг друга; перезапуски при этом не ждут
+# друг друга. В пределах процесса проверка ревизии и запись идут под
+# коротким замком на таблицу; между процессами окно — один запрос.
+#
+# Новый процесс не читает лист целиком: последнее состояние лежит на
+# диске (snapshots.py), и у таблицы спрашиваются только ревизия, колонка
+# ревизий строк и строки новее снимка. Правки листа руками ревизию не
+# меняют — их подхватит полное чтение, когда снимок состарится.
+#
+# gspread и google-auth импортируются при первом подключении: если до
+# таблицы дело не дошло (нет секрета, упали курсы), процесс их не грузит.
+#
+# Все вызовы API идут через общий планировщик (sheets_scheduler.py): квота,
+# склейка одинаковых чтений и batch-записей, повторы на 429/5xx.
+
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import streamlit as st
+
+import snapshots
+from money import rub, to_minor
+from periods import normalize_months
+from sheets_scheduler import scheduler, status_of
+from tracing import on_response, traced
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+HEADER = ["Месяц", "Накоплено (₽)"]
+REVISION_LABEL = "Ревизия"
+REVISION_CELL = "D1"
+LEDGER_TITLE = "Журнал"
+LEDGER_HEADER = ("Время", "Месяц", "Валюта", "Сумма", "Курс", "Сумма (₽)")
+
+# Ответы, после которых хэндл листа считаем протухшим: лист удалён (404)
+# или переименован — тогда старое имя в диапазоне не парсится (400)
+STALE_STATUSES = (400, 404)
+
+# Сколько секунд общий кэш чтения доверяет своим данным. Наши записи кэш
+# обновляют сами, TTL нужен только для правок мимо приложения
+CACHE_TTL = 60
+
+# Больше изменённых строк с ревизии снимка — дешевле прочитать лист целиком
+MAX_DELTA_ROWS = 200
+
+
+# ---------------- Подключение ----------------
+@st.cache_resource(show_spinner=False)
+def _gspread_client():
+    """
+    Один клиент на процесс: токен сервисного аккаунта живёт в credentials и
+    обновляется AuthorizedSession только по истечении, соединения к
+    sheets.googleapis.com переиспользуются из пула.
+    """
+    info = st.secrets["gcp_service_account"]  # нет секрета — падаем до тяжёлых импортов
+
+    import gspread
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2.service_account import Credentials
+    from requests.adapters import HTTPAdapter
+
+    credentials = Credentials.from_service_account_info(info, scopes=SCOPES)
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+    session.hooks["response"].append(on_response)
+    return gspread.authorize(credentials, session=session)
+
+
+class SheetHandle:
+    """
+    Общий для всех сессий хэндл листа таблицы (title=None — первый лист;
+    лист с другим именем создаётся с заголовком header, если его нет).
+    Проксирует методы gspread.Worksheet через планировщик; если лист
+    протух, переоткрывает таблицу и повторяет вызов один раз.
+    """
+
+    def __init__(self, spreadsheet_id, title=None, header=None):
+        self.spreadsheet_id = spreadsheet_id
+        self.title = title
+        self.header = header
+        self._lock = threading.Lock()
+        self._ws = None
+
+    def _open(self):
+        spreadsheet = _gspread_client().open_by_key(self.spreadsheet_id)
+        if self.title is None:
+            return spreadsheet.sheet1
+        import gspread
+
+        try:
+            return spreadsheet.worksheet(self.title)
+        except gspread.WorksheetNotFound:
+            ws = spreadsheet.add_worksheet(self.title, rows=1000, cols=len(self.header))
+            ws.append_row(list(self.header), value_input_option='RAW')
+            return ws
+
+    def worksheet(self, reopen=False):
+        with self._lock:
+            if self._ws is None or reopen:
+                # open_by_key/worksheet — тоже запросы к API, под той же квотой; но
+                # _open может создать лист и дописать заголовок, так что это запись,
+                # и 5xx не повторяем — лист мог и создаться
+                self._ws = scheduler.run("write", self._open, idempotent=False)
+            return self._ws
+
+    def _invoke(self, name, args, kwargs):
+        try:
+            return getattr(self.worksheet(), name)(*args, **kwargs)
+        except Exception as e:
+            if status_of(e) not in STALE_STATUSES:
+                raise
+            return getattr(self.worksheet(reopen=True), name)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if not callable(getattr(self.worksheet(), name)):
+            return getattr(self.worksheet(), name)
+
+        def call(*args, **kwargs):
+            return scheduler.call(self, name, args, kwargs, self._invoke)
+
+        return call
+
+
+@st.cache_resource(show_spinner=False)
+def get_sheet(spreadsheet_id, title=None, header=None):
+    """Хэндл листа, общий для всех сессий и перезапусков скрипта."""
+    handle = SheetHandle(spreadsheet_id, title, header)
+    handle.worksheet()  # открываем сразу, чтобы ошибки доступа всплыли здесь
+    return handle
+
+
+def get_ledger(spreadsheet_id):
+    """Хэндл листа-журнала пополнений."""
+    return get_sheet(spreadsheet_id, LEDGER_TITLE, LEDGER_HEADER)
+
+
+def connect_error_message(e):
+    """Текст для st.error, если не удалось открыть хранилище накоплений."""
+    gspread = sys.modules.get("gspread")  # не импортирован — значит, и ошибка не его
+    if gspread is not None and isinstance(e, gspread.SpreadsheetNotFound):
+        return (
+            "❌ Google Sheet не найден.\n\n"
+            "Проверь, что:\n"
+            "1. ID таблицы указан верно.\n"
+            "2. Таблица доступна для сервисного аккаунта:\n"
+            f"   `{st.secrets['gcp_service_account']['client_email']}`\n"
+            "   (Добавь его как 'Редактор' через 'Поделиться')."
+        )
+    if status_of(e) == 429:
+        return "⏳ Google Sheets API сейчас ограничивает запросы (квота в минуту). Обнови страницу через минуту."
+    return f"Ошибка при подключении к хранилищу накоплений: {e}"
+
+
+def ledger_entry(month, currency, amount, rate, in_rub=None):
+    """
+    Строка журнала: одна внесённая сумма в одной валюте и курс, по которому её
+    учли. in_rub — точная сумма в рублях из money.RateTable.kopecks (иначе amount * rate).
+    """
+    return [
+        datetime.now().isoformat(timespec="seconds"),
+        month,
+        currency,
+        float(amount),
+        float(rate),
+        round(float(amount) * float(rate), 2) if in_rub is None else float(in_rub),
+    ]
+
+
+# ---------------- Общий кэш чтения ----------------
+# (spreadsheet_id, диапазон) -> (момент протухания, строки). Один на процесс,
+# поэтому новые сессии читают таблицу без обращения к API.
+_read_cache = {}
+_read_cache_lock = threading.Lock()
+
+
+def _cached_values(sheet, rng, ttl, fetch=None):
+    """Строки диапазона из общего кэша; промах — fetch(cold) или чтение диапазона (cold — ключа ещё не было)."""
+    key = (sheet.spreadsheet_id, rng)
+    with _read_cache_lock:
+        hit = _read_cache.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            return [list(row) for row in hit[1]]
+    if fetch is not None:
+        values = fetch(hit is None)
+    else:
+        values = sheet.get_values(rng, value_render_option='UNFORMATTED_VALUE')
+    with _read_cache_lock:
+        _read_cache[key] = (time.monotonic() + ttl, values)
+    return [list(row) for row in values]
+
+
+def _cache_rewrite(sheet, data, revision):
+    """После полной перезаписи кладём свежие строки во все закэшированные диапазоны таблицы."""
+    rows = [_header_row(revision)] + [[m, v, revision] for m, v in data.items()]
+    with _read_cache_lock:
+        for key, (expires, _) in list(_read_cache.items()):
+            spreadsheet_id, rng = key
+            if spreadsheet_id != sheet.spreadsheet_id:
+                continue
+            last_row = re.search(r"(\d+)$", rng)
+            _read_cache[key] = (expires, rows[:int(last_row.group(1))] if last_row else rows)
+
+
+def _cache_patch(sheet, cells, previous, revision):
+    """
+    После дельта-записи правим в кэше ячейки B (cells: {номер строки данных: ₽}).
+    Кэш, снятый не с ревизии previous, уже не совпадает с листом — выбрасываем.
+    """
+    with _read_cache_lock:
+        for key, (expires, values) in list(_read_cache.items()):
+            if key[0] != sheet.spreadsheet_id:
+                continue
+            if not values or _revision_of(values[0]) != previous:
+                del _read_cache[key]
+                continue
+            values = [list(row) for row in values]
+            for i, v in cells.items():
+                if i + 1 < len(values):
+                    values[i + 1][1:3] = [v, revision]
+            values[0] = _header_row(revision)
+            _read_cache[key] = (expires, values)
+
+
+# ---------------- Итоги по месяцам ----------------
+class Snapshot(dict):
+    """
+    synced: {месяц: ₽} в порядке строк листа и revision — ревизия, с которой
+    он снят. revision=None — часть строк могла устареть (после слияния мы
+    перечитали только свои), и следующая запись снова сверится с листом.
+    legacy — на листе старые подписи месяцев или повторы: ключи снимка уже
+    '2025-07', но строкам листа не соответствуют, и писать можно только
+    перезаписью целиком.
+    attempt — запись с этого снимка, ответ на которую потерян (см. _send):
+    пока она не сверена с листом, дельту от снимка заново не пишем.
+    """
+
+    def __init__(self, data=(), revision=None, legacy=False):
+        super().__init__(data)
+        self.revision = revision
+        self.legacy = legacy
+        self.attempt = None
+
+
+def _header_row(revision):
+    return [*HEADER, REVISION_LABEL, revision]
+
+
+def _as_revision(value):
+    """Номер ревизии из ячейки; пустая (старые таблицы) — 0."""
+    try:
+        return int(value) if value not in ("", None) else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _revision_of(row):
+    """Ревизия листа из первой строки."""
+    return _as_revision(row[3]) if len(row) > 3 else 0
+
+
+def _cell_revision(values):
+    """Ревизия из ответа на чтение одной ячейки ([[7]] или [])."""
+    return _as_revision(values[0][0]) if values and values[0] else 0
+
+
+def _read_revision(sheet):
+    return _cell_revision(sheet.get_values(REVISION_CELL, value_render_option='UNFORMATTED_VALUE'))
+
+
+def _snapshot(values):
+    """Сырые строки листа с первой (заголовок + ревизия) -> Snapshot."""
+    header, rows = (values[0], values[1:]) if values else ([], [])
+    rows = [row for row in rows if row]
+    # числа и строки вида '64 547,36 ₽' — одним проходом, в копейках
+    sums = rub(to_minor([row[1] if len(row) > 1 else 0.0 for row in rows])).tolist()
+    # ключи — как у сессии ('2025-07'), иначе дельта data − synced по старой
+    # подписи сочла бы весь месяц новым
+    months = [row[0] for row in rows]
+    data = normalize_months(zip(months, sums))
+    return Snapshot(data, _revision_of(header), legacy=list(data) != months)
+
+
+_commit_locks = {}
+_commit_locks_lock = threading.Lock()
+
+
+def _commit_lock(spreadsheet_id):
+    """Замок «сверить ревизию + записать» для одной таблицы: держится на время двух-трёх запросов."""
+    with _commit_locks_lock:
+        return _commit_locks.setdefault(spreadsheet_id, threading.Lock())
+
+
+@traced("load_savings")
+def load_savings(sheet, month_keys, ttl=CACHE_TTL):
+    """
+    Возвращает (data, synced):
+      data   — {месяц: ₽} по ключам month_keys ('2025-07', см. periods.py)
+               плюс месяцы, найденные в таблице;
+               month_keys=None — все строки листа
+      synced — Snapshot строк таблицы в их порядке, для дельта-записи
+    """
+    # Читаем сырые значения (числа), без локального форматирования
+    if month_keys is not None:
+        synced = _snapshot(_cached_values(sheet, f"A1:D{1 + len(month_keys)}", ttl))
+    else:
+        synced = _snapshot(_cached_values(sheet, "A1:D", ttl, lambda cold: _read_sheet(sheet, cold)))
+    data = {m: 0.0 for m in month_keys or ()}
+    data.update(synced)
+    return data, synced
+
+
+def _read_sheet(sheet, cold):
+    """
+    Весь лист для общего кэша. В новом процессе (cold) — по снимку на диске
+    и строкам новее него, иначе — целиком; свежее состояние кладём в снимок.
+    """
+    disk = snapshots.read(sheet.spreadsheet_id) if cold else None
+    values = _catch_up(sheet, *disk) if disk is not None else None
+    if values is None:
+        values = sheet.get_values("A1:D", value_render_option='UNFORMATTED_VALUE')
+    revision = _revision_of(values[0]) if values else 0
+    synced = _snapshot(values)
+    # снимок со старыми подписями не ляжет на строки листа — ждём первой записи
+    if not synced.legacy and (disk is None or disk[1] != revision):
+        snapshots.write(sheet.spreadsheet_id, synced, revision)
+    return values
+
+
+def _catch_up(sheet, data, revision):
+    """
+    Строки листа по снимку {месяц: ₽} ревизии revision: одним batch_get —
+    ревизия листа и колонка ревизий строк, вторым — только строки новее
+    снимка. None — строк слишком много или раскладка непонятна: читаем всё.
+    """
+    got = sheet.batch_get([REVISION_CELL, "C2:C"], value_render_option='UNFORMATTED_VALUE')
+    current = _cell_revision(got[0])
+    rows = [[m, v] for m, v in data.items()]
+    if current != revision:
+        column = [_as_revision(r[0]) if r else 0 for r in got[1]]
+        changed = [i for i, r in enumerate(column) if r > revision]
+        # лист короче снимка — строки удаляли (или ревизии строк не проставлены)
+        if len(column) < len(rows) or len(changed) > MAX_DELTA_ROWS:
+            return None
+        if changed:
+            ranges = [f"A{i + 2}:C{i + 2}" for i in changed]
+            fresh = sheet.batch_get(ranges, value_render_option='UNFORMATTED_VALUE')
+            for i, block in zip(changed, fresh):
+                if i > len(rows):
+                    return None  # пропуск посреди новых строк
+                rows[i:i + 1] = [block[0] if block else []]
+    return [_header_row(current)] + rows
+
+
+def _rewrite_all(sheet, data, tail, revision, synced=None):
+    """
+    Перезаписывает лист поверх, без окна с пустым листом; tail — сколько
+    строк данных на листе сейчас (None — неизвестно), лишний хвост убираем.
+    """
+    rows = [_header_row(revision)] + [[m, v, revision] for m, v in data.items()]
+    if tail is None:
+        clear = [f"A{len(data) + 2}:C"]
+    else:
+        clear = [f"A{len(data) + 2}:C{tail + 1}"] if tail > len(data) else []
+    snapshot = Snapshot(data, revision)
+    attempt = {
+        "revision": revision,
+        "ranges": [f"C2:C{len(data) + 1}"] if data else [],
+        "count": len(data),
+        "clear": clear,
+        "result": snapshot,
+    }
+    _send(sheet, synced, attempt, lambda: sheet.update(rows, value_input_option='RAW'))
+    _cache_rewrite(sheet, data, revision)
+    return snapshot
+
+
+def _write_cells(sheet, synced, cells, revision, fresh):
+    """Одним batch_update — изменившиеся строки (cells: {номер строки: (месяц, ₽)}) и ревизия + 1."""
+    updates = [{"range": f"B{i + 2}:C{i + 2}", "values": [[v, revision + 1]]} for i, (_, v) in cells.items()]
+    updates.append({"range": "C1:D1", "values": [[REVISION_LABEL, revision + 1]]})
+    snapshot = Snapshot(synced, revision + 1 if fresh else None)
+    snapshot.update(cells.values())
+    attempt = {
+        "revision": revision + 1,
+        "ranges": [f"C{i + 2}" for i in cells],
+        "count": len(cells),
+        "clear": [],
+        "result": snapshot,
+    }
+    _send(sheet, synced, attempt, lambda: sheet.batch_update(updates, value_input_option='RAW'))
+    _cache_patch(sheet, {i: v for i, (_, v) in cells.items()}, revision, revision + 1)
+    return snapshot
+
+
+# ---------------- Потерянные ответы ----------------
+# Запись могла дойти до листа, а ответ — потеряться (обрыв, таймаут, 5xx
+# после всех повторов). Повторить её дельтой нельзя: если она дошла, ревизия
+# листа ушла вперёд, и слияние сложит ту же дельту второй раз. Поэтому
+# перед ошибкой смотрим на лист: ревизия в D1 не ниже записанной и во всех
+# наших строках стоит именно она — запись дошла. Не вышло и сверить —
+# запись (attempt) остаётся на снимке, и следующая запись с него начнёт
+# со сверки.
+
+def _send(sheet, synced, attempt, write):
+    if synced is not None:
+        synced.attempt = attempt
+    try:
+        write()
+    except Exception:
+        if not _landed(sheet, attempt):
+            if synced is not None:
+                synced.attempt = None
+            raise
+    if attempt["clear"]:
+        sheet.batch_clear(attempt["clear"])  # упадёт — дочистим при сверке
+    if synced is not None:
+        synced.attempt = None
+
+
+def _landed(sheet, attempt):
+    """Дошла ли до листа запись attempt: ревизия листа и ревизии её строк."""
+    got = sheet.batch_get([REVISION_CELL] + attempt["ranges"], value_render_option='UNFORMATTED_VALUE')
+    cells = [_as_revision(row[0]) if row else 0 for block in got[1:] for row in block]
+    return (
+        _cell_revision(got[0]) >= attempt["revision"]
+        and len(cells) == attempt["count"]
+        and all(c == attempt["revision"] for c in cells)
+    )
+
+
+def _settle(sheet, synced):
+    """Снимок после сверки оборвавшейся записи: дошла — её результат, нет — сам synced."""
+    attempt = synced.attempt
+    if not _landed(sheet, attempt):
+        synced.attempt = None
+        return synced
+    if attempt["clear"]:
+        sheet.batch_clear(attempt["clear"])
+    synced.attempt = None
+    with _read_cache_lock:  # что из записи попало в кэш, неизвестно — перечитаем
+        for key in [k for k in _read_cache if k[0] == sheet.spreadsheet_id]:
+            del _read_cache[key]
+    return attempt["result"]
+
+
+def _rebase_rows(sheet, data, synced, changed):
+    """
+    Лист ушёл вперёд: перечитываем одним batch_get ревизию и только строки
+    changed ([(номер, месяц)]) и прибавляем к ним нашу дельту.
+    Возвращает (ревизия, {номер: (месяц, ₽)}) или None, если строки сдвинулись.
+    """
+    ranges = [REVISION_CELL] + [f"A{i + 2}:B{i + 2}" for i, _ in changed]
+    got = sheet.batch_get(ranges, value_render_option='UNFORMATTED_VALUE')
+    rows = [block[0] if block else [] for block in got[1:]]
+    if len(rows) != len(changed) or any(not row or row[0] != m for row, (_, m) in zip(rows, changed)):
+        return None
+    remote = to_minor([row[1] if len(row) > 1 else 0.0 for row in rows])
+    delta = to_minor([data[m] for _, m in changed]) - to_minor([synced[m] for _, m in changed])
+    merged = rub(remote + delta).tolist()
+    return _cell_revision(got[0]), {i: (m, v) for (i, m), v in zip(changed, merged)}
+
+
+def _rebase_sheet(sheet, data, synced):
+    """
+    Слияние по всему листу (сменилась раскладка строк): свежие строки +
+    наша дельта; месяцы, которых у нас нет, остаются как есть.
+    Возвращает (data, ревизия).
+    """
+    remote = _snapshot(sheet.get_values("A1:D", value_render_option='UNFORMATTED_VALUE'))
+    months = sorted(set(remote) | set(data))
+    # дельта — только по нашим месяцам; чужие строки листа берём как есть
+    delta = to_minor([data.get(m, 0.0) for m in months])
+    delta -= to_minor([synced.get(m, 0.0) if m in data else 0.0 for m in months])
+    merged = to_minor([remote.get(m, 0.0) for m in months]) + delta
+    return dict(zip(months, rub(merged).tolist())), remote.revision
+
+
+@traced("save_savings")
+def save_savings(sheet, data, synced=None, full=False):
+    """
+    Сохраняет data в таблицу и возвращает новый снимок synced.
+
+    Пишется дельта data − synced. Ревизия листа совпала с ревизией снимка —
+    одним batch_update уходят изменившиеся ячейки B и ревизия + 1. Не
+    совпала — перечитываем только изменившиеся строки и пишем свежие
+    значения плюс дельту. Сменилась раскладка месяцев — то же слияние, но
+    по всему листу, и полная перезапись. full=True (сброс) и запись без
+    снимка ставят значения data как есть. Если прошлая запись с synced
+    оборвалась без ответа, сначала проверяем, не дошла ли она.
+    """
+    data = {m: round(float(v), 2) for m, v in data.items()}
+    if getattr(synced, "attempt", None) is not None:
+        with _commit_lock(sheet.spreadsheet_id):
+            synced = _settle(sheet, synced)
+    saved = _commit(sheet, data, synced, full)
+    if saved is not synced and saved.revision is not None:
+        snapshots.write(sheet.spreadsheet_id, saved, saved.revision)
+    return saved
+
+
+@traced("save_savings")
+def replace_savings(sheet, data):
+    """
+    Записывает data как есть (сброс) и возвращает (снимок, {месяц: ₽} на листе
+    до записи): лист читается под тем же замком, что и пишется, так что
+    сторно считается ровно по перезаписанному, с чужими пополнениями.
+    """
+    data = {m: round(float(v), 2) for m, v in data.items()}
+    with _commit_lock(sheet.spreadsheet_id):
+        previous = _snapshot(sheet.get_values("A1:D", value_render_option='UNFORMATTED_VALUE'))
+        saved = _rewrite_all(sheet, data, None, previous.revision + 1)
+    snapshots.write(sheet.spreadsheet_id, saved, saved.revision)
+    return saved, dict(previous)
+
+
+def _commit(sheet, data, synced, full):
+    legacy = getattr(synced, "legacy", False)
+    same_layout = synced is not None and not legacy and list(synced) == list(data)
+    changed = [(i, m) for i, m in enumerate(data) if same_layout and data[m] != round(float(synced[m]), 2)]
+    if same_layout and not full and not changed:
+        return synced
+
+    with _commit_lock(sheet.spreadsheet_id):
+        known = getattr(synced, "revision", None)
+        if same_layout and not full and known is None:
+            # снимок уже частично устарел — сразу сливаем, ревизия придёт тем же запросом
+            rebased = _rebase_rows(sheet, data, synced, changed)
+            if rebased is not None:
+                return _write_cells(sheet, synced, rebased[1], rebased[0], False)
+        revision = _read_revision(sheet)
+        fresh = synced is not None and known == revision
+        # сколько строк данных на листе; у снимка со старыми подписями — неизвестно
+        tail = len(synced) if fresh and not legacy else None
+        if revision == 0:
+            same_layout = False  # лист ещё без ревизий — один раз переписываем целиком, с ревизиями строк
+        if full or synced is None:
+            return _rewrite_all(sheet, data, tail, revision + 1, synced)
+        if same_layout and fresh:
+            return _write_cells(sheet, synced, {i: (m, data[m]) for i, m in changed}, revision, True)
+        if same_layout and known is not None:
+            rebased = _rebase_rows(sheet, data, synced, changed)
+            if rebased is not None:
+                return _write_cells(sheet, synced, rebased[1], rebased[0], False)
+        # сменилась раскладка месяцев или строки на листе сдвинулись
+        if not fresh:
+            data, revision = _rebase_sheet(sheet, data, synced)
+        return _rewrite_all(sheet, data, tail, revision + 1, synced)
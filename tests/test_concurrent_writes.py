@@ -0,0 +1,218 @@
+# ---------------- Слияние одновременных записей ----------------
+# Сессии держат свой снимок synced и пишут дельту поверх того, что сейчас
+# в хранилище; здесь — что пополнения нескольких сессий складываются, в
+# том числе на таблице со старыми подписями месяцев («July 2025»).
+
+import random
+import threading
+import time
+import uuid
+
+import pytest
+
+import backends
+import snapshots
+import storage
+from fakes import FakeClient
+from periods import normalize_months
+from sheets_scheduler import TokenBucket, scheduler
+
+LEGACY = {"July 2025": 1000.0, "Август 2025": 1000.0, "2025-09": 1000.0}
+
+
+@pytest.fixture(autouse=True)
+def _isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(storage, "CACHE_TTL", 0)
+    monkeypatch.setattr(storage, "_gspread_client", storage._gspread_client)  # вернуть после sheets_store
+    # квота API здесь не проверяется — без неё поток сессий не ждёт токенов
+    monkeypatch.setattr(scheduler, "buckets", {"read": TokenBucket(60000), "write": TokenBucket(60000)})
+
+
+def sheets_store(tmp_path, rows):
+    client = FakeClient([list(storage.HEADER)] + [[m, v] for m, v in rows.items()])
+    storage._gspread_client = lambda: client
+    return backends.SheetsStore(f"sid-{uuid.uuid4().hex}")  # хэндлы листа кэшируются по id
+
+
+def sqlite_store(tmp_path, rows):
+    store = backends.SqliteStore(str(tmp_path / "savings.sqlite3"))
+    store.connect()
+    store.save(rows, None, full=True)
+    return store
+
+
+def json_store(tmp_path, rows):
+    store = backends.JsonStore(str(tmp_path / "savings.json"))
+    store.connect()
+    store.save(rows, None, full=True)
+    return store
+
+
+STORES = [sheets_store, sqlite_store, json_store]
+
+
+def deposit(store, month, amount, data, synced):
+    """Как сессия: ключи '2025-07', +amount к месяцу, запись через StoreWriter."""
+    view = normalize_months(data.items())
+    view[month] = view.get(month, 0.0) + amount
+    writer = backends.StoreWriter(store, synced)
+    writer.submit(view)
+    assert writer.flush(), writer.last_error
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_two_sessions_on_legacy_labels(tmp_path, make_store):
+    store = make_store(tmp_path, LEGACY)
+    first = store.load(None)
+    second = store.load(None)
+
+    deposit(store, "2025-07", 500.0, *first)
+    deposit(store, "2025-08", 500.0, *second)
+
+    data, _ = store.load(None)
+    assert data == {"2025-07": 1500.0, "2025-08": 1500.0, "2025-09": 1000.0}
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_concurrent_deposits_add_up(tmp_path, make_store):
+    months = ("2025-07", "2025-08", "2025-09")
+    store = make_store(tmp_path, {m: 100.0 for m in months})
+    total = {m: 10000 for m in months}   # копейки
+    lock = threading.Lock()
+
+    def session(seed):
+        rnd = random.Random(seed)
+        data, synced = store.load(None)
+        view = {m: round(data[m] * 100) for m in months}
+        writer = backends.StoreWriter(store, synced, interval=0.01)
+        for _ in range(10):
+            for m, k in writer.take_remote().items():
+                view[m] += k
+            m, k = rnd.choice(months), rnd.randint(1, 100000)
+            view[m] += k
+            with lock:
+                total[m] += k
+            writer.submit({mm: v / 100 for mm, v in view.items()})
+            if rnd.random() < 0.5:
+                writer.flush()
+        while not writer.flush():
+            pass
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    data, _ = store.load(None)
+    assert {m: round(data[m] * 100) for m in months} == total
+
+
+class LostResponse(ConnectionError):
+    """Запрос дошёл до таблицы, ответ — нет."""
+
+
+@pytest.mark.parametrize("check_fails", [False, True], ids=["checked-now", "checked-on-retry"])
+def test_retry_after_lost_response(tmp_path, monkeypatch, check_fails):
+    store = sheets_store(tmp_path, {"2025-07": 1000.0})
+    store.save({"2025-07": 1000.0}, None, full=True)  # лист с ревизиями строк
+    data, synced = store.load(None)
+    worksheet = store.sheet.worksheet()
+    batch_update, batch_get = worksheet.batch_update, worksheet.batch_get
+    failures = {"read": check_fails}
+
+    def update_then_fail(*args, **kwargs):
+        batch_update(*args, **kwargs)
+        monkeypatch.setattr(worksheet, "batch_update", batch_update)
+        raise LostResponse()
+
+    def get_once_failing(*args, **kwargs):
+        if failures["read"]:
+            failures["read"] = False
+            raise LostResponse()
+        return batch_get(*args, **kwargs)
+
+    monkeypatch.setattr(worksheet, "batch_update", update_then_fail)
+    monkeypatch.setattr(worksheet, "batch_get", get_once_failing)
+    writer = backends.StoreWriter(store, synced)
+    writer.submit({"2025-07": 1500.0})
+    assert writer.flush() is not check_fails
+    assert writer.flush()
+
+    data, _ = store.load(None)
+    assert data == {"2025-07": 1500.0}
+
+
+def test_full_submit_is_not_shifted(tmp_path):
+    store = json_store(tmp_path, {"2025-07": 1000.0})
+    data, synced = store.load(None)
+    store.save({"2025-07": 1200.0}, synced)                 # другая сессия
+    writer = backends.StoreWriter(store, synced)
+    writer.submit({"2025-07": 1500.0})
+    assert writer.flush()
+
+    writer.submit({"2025-07": 0.0}, full=True)
+    assert writer.flush()
+    assert store.load(None)[0] == {"2025-07": 0.0}
+    assert writer.take_remote() == {}
+
+
+def test_writer_thread_exits_when_idle(tmp_path):
+    store = json_store(tmp_path, {"2025-07": 1000.0})
+    writers = [backends.StoreWriter(store, store.load(None)[1], interval=0.01) for _ in range(5)]
+    for i, writer in enumerate(writers):
+        writer.submit({"2025-07": 1000.0 + i})
+
+    deadline = time.monotonic() + 5
+    while any(t.name == "store-writer" for t in threading.enumerate()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not [t for t in threading.enumerate() if t.name == "store-writer"]
+    assert store.load(None)[0] == {"2025-07": 1010.0}
+
+    writers[0].submit({"2025-07": 1500.0})   # следующий submit снова запускает поток
+    assert writers[0].flush()
+    assert store.load(None)[0] == {"2025-07": 1510.0}
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_pull_shows_writes_of_other_sessions(tmp_path, make_store):
+    store = make_store(tmp_path, {"2025-07": 1000.0, "2025-08": 1000.0})
+    reader = backends.StoreWriter(store, store.load(None)[1])
+    reader.pull()
+    assert reader.take_remote() == {}
+
+    deposit(store, "2025-08", 500.0, *store.load(None))
+    reader.pull()
+    assert reader.take_remote() == {"2025-08": 50000}
+
+    reader.submit({"2025-07": 1100.0, "2025-08": 1500.0})  # вид сессии с чужим пополнением
+    assert reader.flush()
+    assert store.load(None)[0] == {"2025-07": 1100.0, "2025-08": 1500.0}
+
+
+def ledger_total(store):
+    """Сумма колонки «Сумма (₽)» журнала хранилища."""
+    if isinstance(store, backends.SheetsStore):
+        rows = store.ledger.get_values()[1:]
+    elif isinstance(store, backends.SqliteStore):
+        with store._connect() as conn:
+            rows = conn.execute("SELECT * FROM ledger").fetchall()
+    else:
+        rows = store._read()["ledger"]
+    return round(sum(float(row[5]) for row in rows), 2)
+
+
+@pytest.mark.parametrize("make_store", STORES)
+def test_reset_reverses_what_it_overwrote(tmp_path, make_store):
+    store = make_store(tmp_path, {})
+    sessions = [backends.StoreWriter(store, store.load(None)[1]) for _ in range(2)]
+    for writer, amount in zip(sessions, (1000.0, 500.0)):
+        writer.submit({"2025-07": amount}, [storage.ledger_entry("2025-07", "RUB", amount, 1.0)])
+        assert writer.flush()
+
+    # первая сессия чужого пополнения не видела — сторно всё равно по хранилищу
+    sessions[0].reset({"2025-07": 0.0})
+    assert sessions[0].flush()
+    assert store.load(None)[0] == {"2025-07": 0.0}
+    assert ledger_total(store) == 0.0
@@ -0,0 +1,37 @@
+import io
+import zipfile
+
+import pytest
+
+from importer import aggregate
+
+
+class Upload(io.BytesIO):
+    """Как UploadedFile Streamlit: байты и имя файла."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+@pytest.mark.parametrize("payload", [b"not a zip at all", b""], ids=["garbage", "empty"])
+def test_corrupt_xlsx_is_a_value_error(payload):
+    pytest.importorskip("openpyxl")
+    with pytest.raises(ValueError):
+        aggregate(Upload(payload, "history.xlsx"), "Дата", "Сумма")
+
+
+def test_zip_without_workbook_is_a_value_error():
+    pytest.importorskip("openpyxl")
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as z:
+        z.writestr("readme.txt", "hello")
+    with pytest.raises(ValueError):
+        aggregate(Upload(data.getvalue(), "history.xlsx"), "Дата", "Сумма")
+
+
+def test_csv_totals_by_month():
+    csv = "Дата;Сумма\n13.07.2025;1 000,50\n20.07.2025;499,50\n01.08.2025;\n02.08.2025;200\n".encode()
+    totals, read, skipped = aggregate(Upload(csv, "history.csv"), "Дата", "Сумма")
+    assert (read, skipped) == (4, 1)
+    assert dict(zip(totals["month"], totals["kopecks"])) == {"2025-07": 150000, "2025-08": 20000}
@@ -0,0 +1,65 @@
+# ---------------- Суммы в копейках ----------------
+# Разбор сумм из таблиц и форм (to_minor) и пересчёт по курсам ЦБ (RateTable):
+# точно в целых, с округлением половины от нуля; переполнение int64 — ошибка.
+
+import pytest
+
+from money import RateTable, to_minor
+
+
+@pytest.mark.parametrize("text, minor", [
+    ("64 547,36 ₽", 6454736),
+    ("64 547,36", 6454736),
+    ("1 000", 100000),
+    ("-0,5", -50),
+    ("12.999", 1300),
+    ("12.994", 1299),
+    ("+7", 700),
+    (",5", 50),
+])
+def test_text_is_parsed_exactly(text, minor):
+    assert to_minor([text]).tolist() == [minor]
+
+
+@pytest.mark.parametrize("value", ["", "   ", "abc", "12,34,56", "-", None])
+def test_empty_and_garbage_are_zero(value):
+    assert to_minor([value]).tolist() == [0]
+
+
+def test_numbers_round_half_away_from_zero():
+    assert to_minor([0.285, -0.285, 1.005, 64547.36]).tolist() == [29, -29, 101, 6454736]
+    assert to_minor(["1,5", 2.25, None]).tolist() == [150, 225, 0]
+
+
+def test_large_amounts_stay_exact():
+    assert to_minor(["9 999 999 999 999 999,99"]).tolist() == [999_999_999_999_999_999]
+    assert to_minor([1e15]).tolist() == [100_000_000_000_000_000]
+
+
+@pytest.mark.parametrize("values", [
+    [1e20], [-1e20], [float("inf")], ["100000000000000000000"], ["1", 1e20],
+], ids=["float", "negative", "inf", "text", "mixed"])
+def test_overflow_is_rejected(values):
+    with pytest.raises(ValueError):
+        to_minor(values)
+
+
+def test_nominal_divides_the_rate():
+    table = RateTable({"UZS": (73.5432, 10000), "USD": (95.1234, 1)})
+    # 1 000 000 сум × 73,5432 ₽ / 10 000 = 7 354,32 ₽
+    assert table.kopecks([1_000_000], ["UZS"]).tolist() == [735432]
+    assert table.kopecks(["1,01"], ["UZS"]).tolist() == [1]  # 0,0074 ₽ -> 1 копейка
+    assert table.unit("UZS") == pytest.approx(0.00735432)
+    assert table.value({"UZS": 1_000_000, "USD": 10, "RUB": 0.5}) == 735432 + 95123 + 50
+
+
+def test_large_amount_converts_without_overflow():
+    table = RateTable({"USD": (95.1234, 1)})
+    amount = 10 ** 12  # долларов
+    expected = (amount * 100 * 951234 + 5000) // 10000  # копеек, точно
+    assert table.kopecks([str(amount)], ["USD"]).tolist() == [expected]
+
+
+def test_unknown_currency_is_a_value_error():
+    with pytest.raises(ValueError):
+        RateTable({}).kopecks([1], ["EUR"])
@@ -0,0 +1,183 @@
+# ---------------- Планировщик запросов к Sheets API ----------------
+# Вместо gspread — invoke, который записывает вызовы и может придержать
+# ответ, пока тест не отпустит: так видно, что чтения делят летящий запрос,
+# записи склеиваются по порядку, а повторы идут только там, где можно.
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from sheets_scheduler import SheetsScheduler
+
+HANDLE = SimpleNamespace(spreadsheet_id="sid", title=None)
+
+
+class ApiError(Exception):
+    """Как gspread.exceptions.APIError: статус — в response.status_code."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.response = SimpleNamespace(status_code=status)
+
+
+class Api:
+    """Фейковый invoke: пишет вызовы; hold() задерживает следующий до release()."""
+
+    def __init__(self, *outcomes):
+        self.calls = []
+        self.outcomes = list(outcomes)  # исключение или значение на каждый вызов; дальше — "ok"
+        self.started = threading.Semaphore(0)
+        self._gate = None
+        self._lock = threading.Lock()
+
+    def hold(self):
+        self._gate = threading.Event()
+        return self._gate
+
+    def __call__(self, name, args, kwargs):
+        with self._lock:
+            self.calls.append((name, args))
+            gate, self._gate = self._gate, None
+            outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        self.started.release()
+        if gate is not None:
+            gate.wait(5)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def scheduler():
+    # квота здесь не проверяется, а паузы между повторами — нулевые
+    return SheetsScheduler(60000, 60000, base_delay=0, max_delay=0)
+
+
+def spawn(fn, *args):
+    """fn(*args) в потоке; результат или исключение — в словаре."""
+    box = {}
+
+    def target():
+        try:
+            box["result"] = fn(*args)
+        except Exception as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    box["thread"] = thread
+    return box
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "не дождались"
+        time.sleep(0.005)
+
+
+def pending(scheduler):
+    return sum(len(slot["pending"]) for slot in scheduler._groups.values())
+
+
+def append(scheduler, api, rows):
+    return scheduler.call(HANDLE, "append_rows", (rows,), {}, api)
+
+
+def test_same_read_shares_the_request_in_flight(scheduler):
+    api = Api([["A", "B"]])
+    gate = api.hold()
+    first = spawn(scheduler.call, HANDLE, "get_values", ("A1:D",), {}, api)
+    api.started.acquire()
+    second = spawn(scheduler.call, HANDLE, "get_values", ("A1:D",), {}, api)
+    wait_until(lambda: scheduler.stats()["coalesced"] == 1)
+    gate.set()
+    for box in (first, second):
+        box["thread"].join(5)
+        assert box["result"] == [["A", "B"]]
+    assert len(api.calls) == 1
+    # после ответа то же чтение снова идёт в API
+    scheduler.call(HANDLE, "get_values", ("A1:D",), {}, api)
+    assert len(api.calls) == 2
+
+
+def test_appends_in_flight_are_merged_in_order(scheduler):
+    api = Api("first", "merged")
+    gate = api.hold()
+    a = spawn(append, scheduler, api, [["a"]])
+    api.started.acquire()
+    b = spawn(append, scheduler, api, [["b"]])
+    wait_until(lambda: pending(scheduler) == 1)
+    c = spawn(append, scheduler, api, [["c"], ["c2"]])
+    wait_until(lambda: pending(scheduler) == 2)
+    gate.set()
+    for box in (a, b, c):
+        box["thread"].join(5)
+    assert api.calls == [("append_rows", ([["a"]],)), ("append_rows", ([["b"], ["c"], ["c2"]],))]
+    assert (a["result"], b["result"], c["result"]) == ("first", "merged", "merged")
+    assert scheduler.stats()["merged"] == 1
+    assert not scheduler._groups
+
+
+def test_failed_merged_request_fails_every_caller_in_it(scheduler):
+    api = Api("first", ApiError(400))
+    gate = api.hold()
+    a = spawn(append, scheduler, api, [["a"]])
+    api.started.acquire()
+    b = spawn(append, scheduler, api, [["b"]])
+    wait_until(lambda: pending(scheduler) == 1)
+    c = spawn(append, scheduler, api, [["c"]])
+    wait_until(lambda: pending(scheduler) == 2)
+    gate.set()
+    for box in (a, b, c):
+        box["thread"].join(5)
+    assert a["result"] == "first"
+    assert isinstance(b["error"], ApiError) and b["error"] is c["error"]
+    assert not scheduler._groups
+
+
+def test_waiting_caller_takes_over_after_leader_fails(scheduler):
+    api = Api(ApiError(400), "second")
+    gate = api.hold()
+    a = spawn(append, scheduler, api, [["a"]])
+    api.started.acquire()
+    b = spawn(append, scheduler, api, [["b"]])
+    wait_until(lambda: pending(scheduler) == 1)
+    gate.set()
+    for box in (a, b):
+        box["thread"].join(5)
+    # ошибка лидера — только его: ждавший отправил свои строки сам
+    assert isinstance(a["error"], ApiError)
+    assert b["result"] == "second"
+    assert api.calls == [("append_rows", ([["a"]],)), ("append_rows", ([["b"]],))]
+    assert not scheduler._groups
+
+
+@pytest.mark.parametrize("name", ["get_values", "batch_update", "append_rows"])
+def test_quota_error_is_retried(scheduler, name):
+    api = Api(ApiError(429), ApiError(429), "ok")
+    assert scheduler.call(HANDLE, name, ([["x"]],), {}, api) == "ok"
+    assert len(api.calls) == 3
+    assert scheduler.stats()["retried"] == 2
+
+
+def test_server_error_is_retried_only_when_idempotent(scheduler):
+    api = Api(ApiError(503), "ok")
+    assert scheduler.call(HANDLE, "update", ("A1", [["x"]]), {}, api) == "ok"
+    assert len(api.calls) == 2
+
+    for name, args in (("append_row", (["x"],)), ("append_rows", ([["x"]],))):
+        api = Api(ApiError(503), "ok")
+        with pytest.raises(ApiError):
+            scheduler.call(HANDLE, name, args, {}, api)
+        assert len(api.calls) == 1
+
+
+def test_retries_give_up_after_max_retries():
+    scheduler = SheetsScheduler(60000, 60000, max_retries=2, base_delay=0, max_delay=0)
+    api = Api(*[ApiError(429)] * 5)
+    with pytest.raises(ApiError):
+        scheduler.call(HANDLE, "get_values", ("A1:D",), {}, api)
+    assert len(api.calls) == 3
@@ -0,0 +1,195 @@
+# ---------------- Трассировка перезапусков ----------------
+# Лёгкие замеры по фазам (авторизация в Sheets, курсы, load/save_savings,
+# построение графиков) и счётчики исходящих HTTP-запросов/байтов — на каждый
+# перезапуск скрипта. Трасса перезапуска показывается в отладочной панели, а
+# если задана переменная окружения TRACE_FILE — ещё и дописывается туда одной
+# JSON-строкой для разбора офлайн (файл не ограничен, поэтому по умолчанию
+# экспорта нет: включайте на время замеров).
+#
+# Если процесс по ходу перезапуска впервые импортировал модули (холодный
+# старт, ленивые импорты), в трассу попадает и отчёт importtime.report().
+#
+# Трасса живёт в thread-local потока скрипта. Задачи холодного старта
+# (startup.py) пишут фазы и HTTP в свою трассу (attached), и она вливается
+# в трассу перезапуска, который дождался задачи (merge_trace). Остальная
+# работа фоновых потоков (отложенная запись, обновление курсов) в трассы
+# перезапусков не попадает.
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import importtime
+
+TRACE_FILE = os.environ.get("TRACE_FILE") or None
+KEEP_IN_SESSION = 20  # сколько последних трасс держать для панели
+
+_local = threading.local()
+_file_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self):
+        self.app = None             # None — перезапуск ещё не начался (работают колбэки)
+        self.started = time.perf_counter()
+        self.phases = {}            # имя -> {"ms": ..., "calls": ...}
+        self.http = {"calls": 0, "bytes_out": 0, "bytes_in": 0}
+        self.merged = False         # уже влита в трассу перезапуска (merge_trace)
+
+
+def _current(create=False):
+    trace = getattr(_local, "trace", None)
+    # Новую трассу заводим только в потоке скрипта: колбэки виджетов
+    # выполняются до самого скрипта и попадают в трассу этого перезапуска
+    if trace is None and create and get_script_run_ctx(suppress_warning=True) is not None:
+        trace = _local.trace = Trace()
+    return trace
+
+
+def start_trace(app):
+    trace = _current(create=True) or Trace()
+    _local.trace = trace
+    trace.app = app
+    return trace
+
+
+def finish_trace():
+    """Закрывает трассу текущего перезапуска: в сессию (для панели) и строкой в TRACE_FILE, если он задан."""
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if trace is None or trace.app is None:
+        return None
+    record = {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "app": trace.app,
+        "total_ms": round((time.perf_counter() - trace.started) * 1000, 2),
+        "phases": trace.phases,
+        "http": trace.http,
+    }
+    imports = importtime.report()
+    if imports:
+        record["imports"] = imports
+    if TRACE_FILE:
+        line = json.dumps(record, ensure_ascii=False)
+        try:
+            with _file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+    traces = st.session_state.setdefault("traces", [])
+    traces.append(record)
+    del traces[:-KEEP_IN_SESSION]
+    return record
+
+
+@contextmanager
+def attached(trace):
+    """Фазы и HTTP текущего потока на время блока пишутся в trace (задачи пула)."""
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def merge_trace(other):
+    """Вливает трассу задачи other в трассу текущего перезапуска — один раз."""
+    trace = _current(create=True)
+    if trace is None or other.merged:
+        return
+    other.merged = True
+    for name, p in other.phases.items():
+        mine = trace.phases.setdefault(name, {"ms": 0.0, "calls": 0})
+        mine["ms"] = round(mine["ms"] + p["ms"], 2)
+        mine["calls"] += p["calls"]
+    for key, value in other.http.items():
+        trace.http[key] += value
+
+
+@contextmanager
+def phase(name):
+    trace = _current(create=True)
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            p = trace.phases.setdefault(name, {"ms": 0.0, "calls": 0})
+            p["ms"] = round(p["ms"] + (time.perf_counter() - t) * 1000, 2)
+            p["calls"] += 1
+
+
+def traced(name):
+    """Декоратор: время вызовов функции копится в фазе name."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_run(name):
+    """
+    Для st.fragment: если фрагмент перезапускается сам по себе, его прогон
+    пишется отдельной трассой name; внутри полного перезапуска — ничего не делает.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current()
+            if trace is not None and trace.app is not None:
+                return fn(*args, **kwargs)
+            start_trace(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finish_trace()
+        return wrapper
+    return decorator
+
+
+def on_response(response, *args, **kwargs):
+    """requests-хук: считает исходящие запросы и байты в трассу текущего перезапуска."""
+    trace = _current(create=True)
+    if trace is not None:
+        body = response.request.body or b""
+        trace.http["calls"] += 1
+        trace.http["bytes_out"] += len(body)
+        trace.http["bytes_in"] += len(response.content or b"")
+    return response
+
+
+def render_debug_panel():
+    traces = st.session_state.get("traces", [])
+    if not traces:
+        return
+    with st.expander("🐞 Отладка: время перезапуска по фазам"):
+        last = traces[-1]
+        st.caption(
+            f"{last['app']} · {last['total_ms']:.0f} мс · HTTP: {last['http']['calls']} запр., "
+            f"↑{last['http']['bytes_out']:,} Б ↓{last['http']['bytes_in']:,} Б"
+            + (f" · трассы: {TRACE_FILE}" if TRACE_FILE else "")
+        )
+        # текстом, а не st.table: таблица потянула бы pandas даже на пути ошибки
+        st.text("\n".join(
+            f"{name:<32}{p['ms']:>10.1f} мс  × {p['calls']}"
+            for name, p in sorted(last["phases"].items(), key=lambda kv: -kv[1]["ms"])
+        ))
+        cold = next((t for t in reversed(traces) if "imports" in t), None)
+        if cold:
+            imports = cold["imports"]
+            st.caption(
+                f"Импорты ({cold['ts']}): {imports['total_ms']:.0f} мс, {imports['modules']} модулей · "
+                + ", ".join(f"{name} {ms:.0f}" for name, ms in imports["top"][:5])
+            )
+        st.caption("Последние перезапуски, мс: " + " · ".join(f"{t['total_ms']:.0f}" for t in traces))
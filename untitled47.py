@@ -1,24 +1,21 @@
+import importtime
+importtime.install()
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import requests
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 import time
 
+from charts import plan_pie, progress_pie
+from holdings import holdings_sidebar
+from money import rub
+from periods import DEFAULT_HORIZON, MAX_HORIZON, MonthIndex, Savings, month_label
+from progress import goal_progress
+from rates import fetch_exchange_rates, rate_table
+from tracing import finish_trace, render_debug_panel, start_trace
+
 # --- Настройки страницы ---
 st.set_page_config(page_title="Финансовый дашборд", layout="wide")
-
-# --- Загрузка онлайн-курса валют ---
-def fetch_exchange_rates():
-    try:
-        response = requests.get("https://www.cbr-xml-daily.ru/daily_json.js")
-        data = response.json()
-        usd = data['Valute']['USD']['Value']
-        uzs = data['Valute'].get('UZS', {}).get('Value', None)
-        return usd, uzs
-    except:
-        return None, None
+start_trace("untitled47.py")
 
 # --- Блок с актуальными курсами валют ---
 def display_exchange_rates(usd_rate, uzs_rate):
@@ -35,78 +32,68 @@ def display_exchange_rates(usd_rate, uzs_rate):
 # --- Основная функция отображения ---
 
 def recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date):
-    pie_labels = list(st.session_state.savings_by_month.keys())
-    pie_values = list(st.session_state.savings_by_month.values())
-    accumulated = start_capital + sum(pie_values)
-    remaining_to_goal = max(0, goal_rub - accumulated)
-    estimated_months = int(remaining_to_goal / monthly_plan_rub) if monthly_plan_rub else 1
-    estimated_finish_date = start_date + timedelta(days=estimated_months * 30)
-    percent_complete = accumulated / goal_rub * 100 if goal_rub else 0
+    savings = st.session_state.savings
+    pie_labels, pie_values = savings.nonzero()
+    accumulated, remaining_to_goal, estimated_finish_date, percent_complete = goal_progress(
+        goal_rub, start_capital, rub(savings.total()), monthly_plan_rub, start_date
+    )
     return pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete
 
 def main():
     st.title("\U0001F4B0 Финансовый дашборд")
 
-    usd_rate, uzs_rate = fetch_exchange_rates()
+    usd_rate, _, uzs_rate, _, _ = fetch_exchange_rates()
     if usd_rate is None or uzs_rate is None:
         st.error("Не удалось загрузить курс валют")
         return
 
     # --- Ввод значений пользователем ---
     st.sidebar.header("Ввод исходных данных")
-    usd_saved = st.sidebar.number_input("Накоплено (USD)", value=12000.0)
-    uzs_saved = st.sidebar.number_input("Накоплено (UZS)", value=51000000.0)
+    table = rate_table()
+    holdings = holdings_sidebar(table.codes)
     goal_rub = st.sidebar.number_input("Итоговая целевая сумма (₽)", value=4498000.0)
     monthly_plan_rub = st.sidebar.number_input("Цель по накоплению в месяц (₽)", value=271634.0)
     monthly_plan_usd = st.sidebar.number_input("Цель по накоплению в месяц ($)", value=3528.0)
     start_date = st.sidebar.date_input("Дата начала", value=date(2025, 7, 13))
+    horizon = st.sidebar.number_input("Горизонт (мес.)", min_value=1, max_value=MAX_HORIZON, value=DEFAULT_HORIZON)
 
         # --- Блок с курсами ---
     display_exchange_rates(usd_rate, uzs_rate)
 
     # --- Перевод в рубли ---
-    rub_from_usd = usd_saved * usd_rate
-    rub_from_uzs = (uzs_saved * uzs_rate) / 10000
+    by_currency = rub(table.kopecks(list(holdings.values()), list(holdings))).tolist()
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Исходные накопления")
-        st.write(f"**USD:** {usd_saved:,.0f} USD")
-        st.write(f"**UZS:** {uzs_saved:,.0f} UZS")
+        for code, amount in holdings.items():
+            st.write(f"**{code}:** {amount:,.0f} {code}")
     with col2:
         st.markdown("### Перевод в рубли")
-        st.write(f"Из USD: {rub_from_usd:,.2f} ₽")
-        st.write(f"Из UZS: {rub_from_uzs:,.2f} ₽")
+        for code, in_rub in zip(holdings, by_currency):
+            st.write(f"Из {code}: {in_rub:,.2f} ₽")
 
-    start_capital = rub_from_usd + rub_from_uzs
+    start_capital = rub(table.value(holdings))
 
         # --- Расчёт месяцев и накоплений ---
-    month_labels = [(start_date + timedelta(days=30 * i)).strftime('%B %Y') for i in range(12)]
+    index = MonthIndex(start_date, horizon)
 
-    if 'savings_by_month' not in st.session_state:
-        st.session_state.savings_by_month = {label: 0 for label in month_labels}
+    if 'savings' not in st.session_state:
+        st.session_state.savings = Savings(index)
+    elif st.session_state.savings.index != index:
+        st.session_state.savings = st.session_state.savings.reindex(index)
 
     # Диаграмма планов по месяцам (без накопленного)
-    fig_plan = px.pie(
-        names=month_labels,
-        values=[monthly_plan_rub for _ in month_labels],
-        title="План по накоплениям на 12 месяцев",
-        hole=0.4
+    st.plotly_chart(
+        plan_pie(index.labels, monthly_plan_rub, f"План по накоплениям на {horizon} мес."),
+        use_container_width=True
     )
-    st.plotly_chart(fig_plan, use_container_width=True)
 
     pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete = recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date)
 
+    # Диаграмму рисуем один раз за перезапуск: после сброса или добавления —
+    # сразу обновлённую, иначе — в конце (см. ниже)
     chart_placeholder = st.empty()
-    filtered_labels = [label for label, value in zip(pie_labels, pie_values) if value > 0]
-    filtered_values = [value for value in pie_values if value > 0]
-
-    fig_pie = px.pie(
-        names=["Начальный капитал"] + [label for label, value in zip(filtered_labels, filtered_values) if value > 0] + ["Остаток"],
-        values=[start_capital] + [value for value in filtered_values if value > 0] + [remaining_to_goal],
-        title="Круговая диаграмма: выполнено и план по месяцам",
-        hole=0.4
-    )
-    chart_placeholder.plotly_chart(fig_pie, use_container_width=True)
+    pie_drawn = False
 
     
     goal_placeholder = st.empty()
@@ -116,16 +103,14 @@ def main():
     # --- Блок сброса данных ---
     with st.expander("⚙️ Дополнительно"):
         if st.button("🔁 Сбросить накопления до начальных значений"):
-            st.session_state.savings_by_month = {label: 0 for label in month_labels}
+            st.session_state.savings = st.session_state.savings.cleared()
             st.success("Данные накоплений сброшены")
             pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete = recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date)
-            fig_pie_reset = px.pie(
-            names=["Начальный капитал"] + [label for label, value in zip(pie_labels, pie_values) if value > 0] + ["Остаток"],
-            values=[start_capital] + [value for label, value in zip(pie_labels, pie_values) if value > 0] + [remaining_to_goal],
-                title="Круговая диаграмма: выполнено и план по месяцам (после сброса)",
-                hole=0.4
-            )
-            chart_placeholder.plotly_chart(fig_pie_reset, use_container_width=True)
+            chart_placeholder.plotly_chart(progress_pie(
+                tuple(pie_labels), tuple(pie_values), start_capital, remaining_to_goal,
+                "Круговая диаграмма: выполнено и план по месяцам (после сброса)"
+            ), use_container_width=True)
+            pie_drawn = True
             goal_placeholder.markdown("""
             <div style='font-size:24px; font-weight:600; margin-top: 1.5rem;'>
                 🎯 <b>Цель:</b> {:,.2f} ₽ &nbsp;&nbsp;&nbsp;
@@ -146,26 +131,24 @@ def main():
         with col3:
             input_rub = st.number_input("Сумма в RUB", min_value=0.0, value=0.0, step=1000.0)
         with col4:
-            selected_month = st.selectbox("Месяц", month_labels)
+            selected_month = st.selectbox("Месяц", index.keys, format_func=month_label)
         submitted = st.form_submit_button("Добавить")
 
     if submitted:
-        added_total = input_rub + input_usd * usd_rate + (input_uzs * uzs_rate) / 10000
+        added = int(table.kopecks([input_rub, input_usd, input_uzs], ["RUB", "USD", "UZS"]).sum())
+        added_total = rub(added)
 
-        if selected_month in st.session_state.savings_by_month:
-            st.session_state.savings_by_month[selected_month] += added_total
+        st.session_state.savings.add(selected_month, added)
 
-        st.success(f"Добавлено {added_total:,.2f} ₽ в {selected_month}")
+        st.success(f"Добавлено {added_total:,.2f} ₽ в {month_label(selected_month)}")
 
         pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete = recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date)
 
-        fig_pie_updated = px.pie(
-            names=["Начальный капитал"] + [label for label, value in zip(pie_labels, pie_values) if value > 0] + ["Остаток"],
-            values=[start_capital] + [value for label, value in zip(pie_labels, pie_values) if value > 0] + [remaining_to_goal],
-            title="Круговая диаграмма: выполнено и план по месяцам (обновлено)",
-            hole=0.4
-        )
-        chart_placeholder.plotly_chart(fig_pie_updated, use_container_width=True)
+        chart_placeholder.plotly_chart(progress_pie(
+            tuple(pie_labels), tuple(pie_values), start_capital, remaining_to_goal,
+            "Круговая диаграмма: выполнено и план по месяцам (обновлено)"
+        ), use_container_width=True)
+        pie_drawn = True
         goal_placeholder.markdown("""
             <div style='font-size:24px; font-weight:600; margin-top: 1.5rem;'>
                 🎯 <b>Цель:</b> {:,.2f} ₽ &nbsp;&nbsp;&nbsp;
@@ -178,14 +161,26 @@ def main():
         
         
 
+    if not pie_drawn:
+        chart_placeholder.plotly_chart(progress_pie(
+            tuple(pie_labels), tuple(pie_values), start_capital, remaining_to_goal,
+            "Круговая диаграмма: выполнено и план по месяцам"
+        ), use_container_width=True)
+
 # --- Таблица с накоплениями по месяцам ---
     st.markdown("### Таблица накоплений по месяцам")
+    import pandas as pd
+
     savings_table = pd.DataFrame({
-        "Месяц": month_labels,
-        "План (₽)": [monthly_plan_rub for _ in month_labels],
-        "Накоплено (₽)": [st.session_state.savings_by_month[label] for label in month_labels]
+        "Месяц": index.labels,
+        "План (₽)": monthly_plan_rub,
+        "Накоплено (₽)": st.session_state.savings.series(),
     })
     st.dataframe(savings_table.style.format({"План (₽)": "{:.2f}", "Накоплено (₽)": "{:.2f}"}), use_container_width=True)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        finish_trace()
+    render_debug_panel()
@@ -1,61 +1,52 @@
+import importtime
+importtime.install()
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import requests
 from datetime import date, timedelta, datetime
-import gspread
-from google.oauth2.service_account import Credentials
-import plotly.graph_objects as go
-from decimal import Decimal, ROUND_HALF_UP
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+# pandas, plotly, gspread/google-auth и numpy-модули (valuation, projection)
+# грузятся лениво — в тех функциях, которым они нужны
+from backends import StoreWriter, apply_deposit, apply_reset, open_store
+from charts import monthly_fact_line, progress_pie
+from holdings import holdings_sidebar
+from money import MAX_AMOUNT, rub, to_minor
+from periods import DEFAULT_HORIZON, MAX_HORIZON, MonthIndex, Savings, add_months, month_key, month_label
+from progress import goal_progress
+from rates import ensure_history, fetch_exchange_rates, history as rate_history, rate_table
+from sheets_scheduler import status_line as sheets_status_line
+from startup import start, wait
+from storage import connect_error_message
+from tracing import finish_trace, render_debug_panel, start_trace, traced, traced_run
 
 # ---------------- Настройки ----------------
 st.set_page_config(page_title="Финансовый дашборд", layout="wide")
+start_trace("upd.py")
 
 # ID твоей таблицы (из URL между /d/ и /edit)
 SPREADSHEET_ID = "1-D2RvWH5WUP00KqA18mAfj3kDOpedMkOwo8UI_Xd_A4"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
-# Авторизация
-try:
-    credentials = Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"], scopes=SCOPES
-    )
-    gc = gspread.authorize(credentials)
-    sheet = gc.open_by_key(SPREADSHEET_ID).sheet1
-except gspread.SpreadsheetNotFound:
-    st.error(
-        "❌ Google Sheet не найден.\n\n"
-        "Проверь, что:\n"
-        "1. ID таблицы указан верно.\n"
-        "2. Таблица доступна для сервисного аккаунта:\n"
-        f"   `{st.secrets['gcp_service_account']['client_email']}`\n"
-        "   (Добавь его как 'Редактор' через 'Поделиться')."
-    )
-    st.stop()
-except Exception as e:
-    st.error(f"Ошибка при подключении к Google Sheets: {e}")
-    st.stop()
+# Сколько секунд ждём каждую из стартовых задач, прежде чем показать то, что есть
+RATES_TIMEOUT = 15
+SHEETS_TIMEOUT = 30
+# Не дождались таблицы — раз в столько секунд проверяем ту же задачу
+SHEETS_POLL = 2
+
+# Сетка «что если»: планов × курсов USD × курсов UZS
+WHAT_IF_PLANS, WHAT_IF_USD, WHAT_IF_UZS = 100, 100, 20
 
 # ---------------- Обновлённые функции ----------------
-@st.cache_data(ttl=3600)
-def fetch_exchange_rates():
+def connect_and_load(index):
     """
-    Возвращает:
-      usd, usd_prev — текущий и вчерашний курс USD→₽
-      uzs, uzs_prev — текущий и вчерашний курс UZS→₽ за 1 сум
-      ts            — время обновления (из ответа ЦБ или now)
+    Подключение к хранилищу (по умолчанию Google Sheets, см. backends.py) +
+    чтение накоплений. Выполняется в пуле, параллельно с курсами; хранилище
+    кэшируется на процесс, так что после первого раза здесь остаётся только
+    чтение (и то из общего кэша). Читаем все месяцы хранилища: те, что вне
+    горизонта index, остаются в Savings.extra и не затираются при записи.
     """
-    try:
-        r = requests.get("https://www.cbr-xml-daily.ru/daily_json.js", timeout=10)
-        d = r.json()
-        ts = d.get("Date", None)
-        usd = d["Valute"]["USD"]["Value"]
-        usd_prev = d["Valute"]["USD"]["Previous"]
-        uzs = d["Valute"].get("UZS", {}).get("Value", None)
-        uzs_prev = d["Valute"].get("UZS", {}).get("Previous", None)
-        return usd, usd_prev, uzs, uzs_prev, ts
-    except Exception:
-        return None, None, None, None, None
+    store = open_store(SPREADSHEET_ID)
+    data, synced = store.load(None)
+    return Savings.from_dict(index, data), StoreWriter(store, synced)
 
 def render_rates_board(usd, usd_prev, uzs, uzs_prev, ts):
     st.markdown("### Актуальные курсы валют")
@@ -86,115 +77,188 @@ def render_rates_board(usd, usd_prev, uzs, uzs_prev, ts):
         except Exception:
             c3.caption("Обновлено: сейчас")
             
-def _to_number(x):
-    """'64 547,36' / '64547,36' / 64547.36 -> 64547.36"""
-    if isinstance(x, (int, float)):
-        return float(x)
-    if x is None:
-        return 0.0
-    s = str(x).strip()
-    s = s.replace('₽', '').replace('\u00A0', '').replace(' ', '')
-    s = s.replace(',', '.')
-    try:
-        return float(s) if s else 0.0
-    except ValueError:
-        return 0.0
-
-def load_savings(month_labels):
-    # Читаем сырые значения (числа), без локального форматирования
-    rng = f"A2:B{1 + len(month_labels)}"
-    values = sheet.get_values(rng, value_render_option='UNFORMATTED_VALUE')
-
-    data = {m: 0.0 for m in month_labels}
-    for row in values:
-        if not row:
-            continue
-        m = row[0] if len(row) > 0 else None
-        v = row[1] if len(row) > 1 else 0.0
-
-        # если пришло число — берём как есть; если строка — парсим
-        if isinstance(v, (int, float)):
-            data[m] = float(v)
-        else:
-            data[m] = _to_number(v)
+@st.fragment(run_every=SHEETS_POLL)
+@traced_run("upd.py:sheets_waiter")
+def sheets_waiter():
+    # задача чтения живёт в сессии: готова (или упала) — полный перезапуск её
+    # подберёт; перезагрузка страницы завела бы новую сессию и новую задачу
+    job = st.session_state.get("savings_job")
+    if job is None or job.done():
+        st.rerun()
+    st.info("Хранилище пока не ответило — подожди, накопления появятся сами.")
 
-    return data
+def render_flush_status(writer):
+    # рисуется внутри фрагмента, поэтому не в сайдбаре, а под формой
+    last = f"{writer.last_flush:%H:%M:%S}" if writer.last_flush else "—"
+    st.caption(f"Ожидают записи ({writer.store.name}): {writer.pending} · последняя запись: {last}")
+    if writer.last_error is not None:
+        st.warning(f"Не удалось записать ({writer.store.name}), повторим: {writer.last_error}")
+    mirror = getattr(writer.store, "mirror", None)
+    if mirror is not None and mirror.last_error is not None:
+        st.warning(f"Зеркало в Google Sheets отстаёт, повторим: {mirror.last_error}")
+    quota = sheets_status_line()
+    if quota:
+        st.caption(quota)
 
-def save_savings(data):
-    rows = [["Месяц", "Накоплено (₽)"]]
-    for m, v in data.items():
-        rows.append([m, round(float(v), 2)])  # число, не строка
-    sheet.clear()
-    sheet.update(rows, value_input_option='RAW')
+def build_holdings_ledger(holdings, start_date):
+    """Журнал движений по валютам: исходные суммы на дату начала + рублёвые взносы по месяцам."""
+    import pandas as pd
 
-def recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date):
-    pie_labels = list(st.session_state.savings_by_month.keys())
-    pie_values = list(st.session_state.savings_by_month.values())
-    accumulated = start_capital + sum(pie_values)
-    remaining_to_goal = max(0, goal_rub - accumulated)
-    estimated_months = int(remaining_to_goal / monthly_plan_rub) if monthly_plan_rub else 1
-    estimated_finish_date = start_date + timedelta(days=estimated_months * 30)
-    percent_complete = accumulated / goal_rub * 100 if goal_rub else 0
-    return pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete
+    savings = st.session_state.savings
+    initial = pd.DataFrame(
+        {"date": start_date, "currency": list(holdings), "amount": list(holdings.values())}
+    )
+    monthly = pd.DataFrame({"date": savings.index.dates(), "currency": "RUB", "amount": savings.series()})
+    return pd.concat([initial, monthly[monthly["amount"] != 0]], ignore_index=True)
 
-# ---------------- Основное приложение ----------------
-def main():
-    st.title("💰 Финансовый дашборд")
+@traced("revaluation")
+def render_revaluation(holdings, start_date):
+    import plotly.graph_objects as go
+    from valuation import revalue
 
-    usd, usd_prev, uzs, uzs_prev, ts = fetch_exchange_rates()
-    if usd is None or uzs is None:
-        st.error("Не удалось загрузить курсы валют")
+    today = date.today()
+    if start_date >= today:
         return
+    codes = [c for c in holdings if c != "RUB"]
+    ensure_history(codes, start_date, today)  # недостающие дни догрузятся в фоне
+    ledger = build_holdings_ledger(holdings, start_date)
+    by_currency = revalue(ledger, rate_history(codes, start_date, today), start_date, today)
 
-    # ✅ Верхнее табло с курсами
-    render_rates_board(usd, usd_prev, uzs, uzs_prev, ts)
-    st.divider()
+    st.markdown("### Стоимость накоплений по курсу ЦБ на каждый день")
+    if by_currency[codes].isna().any().any():
+        st.caption(f"История курсов за часть периода ещё загружается — эти дни пока без {'/'.join(codes)}.")
+    fig = go.Figure()
+    for cur in by_currency.columns:
+        fig.add_trace(go.Scatter(
+            x=by_currency.index, y=by_currency[cur], name=cur, mode="lines", stackgroup="total"
+        ))
+    fig.update_yaxes(title_text="₽")
+    st.plotly_chart(fig, use_container_width=True)
 
-    # Ввод исходных данных
-    st.sidebar.header("Ввод исходных данных")
-    usd_saved = st.sidebar.number_input("Накоплено (USD)", value=12000.0)
-    uzs_saved = st.sidebar.number_input("Накоплено (UZS)", value=51000000.0)
-    goal_rub = st.sidebar.number_input("Итоговая цель (₽)", value=4498000.0)
-    monthly_plan_rub = st.sidebar.number_input("План в месяц (₽)", value=271634.0)
-    start_date = st.sidebar.date_input("Дата начала", value=date(2025, 7, 13))
+@traced("projection")
+def render_projection(goal_rub, holdings, table, monthly_plan_rub, months=60):
+    import pandas as pd
+    import plotly.graph_objects as go
+    from projection import forecast, rate_moments
+    from rates import revision as rates_revision
 
-    # Конвертации
-    rub_from_usd = usd_saved * usd
-    rub_from_uzs = (uzs_saved * uzs) / 10000  # UZS→₽ за 10k учтён
-    start_capital = rub_from_usd + rub_from_uzs
+    today = date.today()
+    codes = tuple(c for c in holdings if c != "RUB")  # рубли курсом не двигаются
+    mu, cov = rate_moments(codes, today - timedelta(days=3 * 365), today, rates_revision())
+    savings = st.session_state.savings
+    # одни и те же входы -> результат из кэша projection, 10k путей не разыгрываются заново
+    dates, (low, mid, high) = forecast(
+        goal_rub,
+        rub(savings.total()) + holdings.get("RUB", 0.0),
+        tuple(holdings[c] for c in codes),
+        tuple(table.unit(c) for c in codes),  # ₽ за 1 единицу, с учётом Nominal
+        mu, cov,
+        tuple(savings.series().tolist()),
+        monthly_plan_rub,
+        months,
+        today,
+    )
 
-    # Верхний блок с исходными суммами/конвертацией
-    left, right = st.columns(2)
-    with left:
-        st.markdown("#### Исходные накопления")
-        st.write(f"**USD:** {usd_saved:,.0f} $")
-        st.write(f"**UZS:** {uzs_saved:,.0f} сум")
-    with right:
-        st.markdown("#### Перевод в рубли")
-        st.write(f"Из USD: {rub_from_usd:,.2f} ₽")
-        st.write(f"Из UZS: {rub_from_uzs:,.2f} ₽")
-        st.write(f"**Начальный капитал:** {start_capital:,.2f} ₽")
+    st.markdown("### Прогноз даты завершения (10 000 сценариев)")
+    cols = st.columns(len(dates))
+    for col, (p, d) in zip(cols, dates.items()):
+        col.metric(f"P{p}", d.strftime('%m.%Y') if d else f"позже {months} мес.")
 
-    # Месяцы
-    month_labels = [(start_date + timedelta(days=30 * i)).strftime('%B %Y') for i in range(12)]
-    if "savings_by_month" not in st.session_state:
-        st.session_state.savings_by_month = load_savings(month_labels)
+    x = [pd.Timestamp(today) + pd.DateOffset(months=i + 1) for i in range(months)]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x, y=high, mode="lines", line_width=0, showlegend=False, name="P90"))
+    fig.add_trace(go.Scatter(x=x, y=low, mode="lines", line_width=0, fill="tonexty", name="P10–P90"))
+    fig.add_trace(go.Scatter(x=x, y=mid, mode="lines", name="P50"))
+    fig.add_hline(y=goal_rub, line_dash="dot", annotation_text="Цель", annotation_position="top left")
+    fig.update_yaxes(title_text="₽")
+    st.plotly_chart(fig, use_container_width=True)
 
-    # 🔄 Диаграмма прогресса (оставляем только одну — как просил)
+@traced("what_if")
+def render_what_if(goal_rub, monthly_plan_rub, start_date, holdings, table, index):
+    import numpy as np
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    from progress import what_if_grid
+
+    st.markdown("### Что если: план × курсы USD и UZS")
+    c1, c2 = st.columns(2)
+    plan_span = c1.slider("Разброс плана, ±%", 10, 90, 50, step=10, key="what_if_plan") / 100
+    rate_span = c2.slider("Разброс курсов, ±%", 5, 50, 30, step=5, key="what_if_rates") / 100
+    plans = np.linspace(1 - plan_span, 1 + plan_span, WHAT_IF_PLANS) * monthly_plan_rub
+    usd_factors = np.linspace(1 - rate_span, 1 + rate_span, WHAT_IF_USD)
+    uzs_factors = np.linspace(1 - rate_span, 1 + rate_span, WHAT_IF_UZS)
+
+    # сколько месяцев горизонта ещё впереди — для недостачи к его концу
+    today = date.today()
+    elapsed = (today.year - start_date.year) * 12 + today.month - start_date.month
+    months_ahead = min(max(len(index) - elapsed, 0), len(index))
+
+    # вся сетка — один расчёт; ползунок UZS ниже только выбирает срез
+    months_left, shortfall = what_if_grid(
+        int(to_minor([goal_rub])[0]), st.session_state.savings.total(), holdings, table,
+        to_minor(plans), {"USD": usd_factors, "UZS": uzs_factors}, months_ahead,
+    )
+    uzs_10k = uzs_factors * table.unit("UZS") * 10000
+    k = st.select_slider(
+        "Курс UZS (₽ за 10 000 сумов)", options=list(range(WHAT_IF_UZS)), value=WHAT_IF_UZS // 2,
+        format_func=lambda i: f"{uzs_10k[i]:.2f}", key="what_if_uzs",
+    )
+
+    left = np.minimum(months_left[:, :, k], MAX_HORIZON)
+    values, inverse = np.unique(left, return_inverse=True)
+    finish = np.array([
+        month_label(month_key(add_months(start_date, int(v)))) if v < MAX_HORIZON else f"позже {MAX_HORIZON} мес."
+        for v in values
+    ])[inverse.reshape(left.shape)]
+    usd = usd_factors * table.unit("USD")
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Месяцев до цели", f"Недостача через {months_ahead} мес., ₽"))
+    fig.add_trace(go.Heatmap(
+        x=usd, y=plans, z=left, customdata=finish, colorscale="RdYlGn_r", colorbar_x=0.45,
+        hovertemplate="USD %{x:.2f} ₽<br>план %{y:,.0f} ₽<br>%{z} мес. — %{customdata}<extra></extra>",
+    ), row=1, col=1)
+    fig.add_trace(go.Heatmap(
+        x=usd, y=plans, z=rub(shortfall[:, :, k]), colorscale="Reds",
+        hovertemplate="USD %{x:.2f} ₽<br>план %{y:,.0f} ₽<br>не хватит %{z:,.0f} ₽<extra></extra>",
+    ), row=1, col=2)
+    fig.update_xaxes(title_text="Курс USD, ₽")
+    fig.update_yaxes(title_text="План в месяц, ₽", col=1)
+    st.plotly_chart(fig, use_container_width=True)
+
+def recalculate_progress(goal_rub, start_capital, monthly_plan_rub, start_date):
+    savings = st.session_state.savings
+    pie_labels, pie_values = savings.nonzero()
+    accumulated, remaining_to_goal, estimated_finish_date, percent_complete = goal_progress(
+        goal_rub, start_capital, rub(savings.total()), monthly_plan_rub, start_date
+    )
+    return pie_labels, pie_values, accumulated, remaining_to_goal, estimated_finish_date, percent_complete
+
+# ---------------- Фрагменты ----------------
+# Каждый блок дашборда — st.fragment: взаимодействие внутри блока
+# перезапускает только его. Отправка формы перезапускает savings_section —
+# форму и зависящие от накоплений виды; табло курсов, авторизация и
+# верхний блок при этом не выполняются.
+
+@st.fragment(run_every=600)
+@traced_run("upd.py:rates_board")
+def rates_board_fragment():
+    # В полном перезапуске курсы уже получены задачей пула и переданы через
+    # board_rates (аргументы фрагмента застывают на полном прогоне, поэтому не
+    # ими); сам фрагмент раз в 10 минут читает свежие из локального хранилища
+    rates = st.session_state.pop("board_rates", None) or fetch_exchange_rates()
+    render_rates_board(*rates)
+
+@st.fragment
+@traced_run("upd.py:progress")
+def progress_fragment(goal_rub, start_capital, monthly_plan_rub, start_date, holdings, table):
     pie_labels, pie_values, accumulated, remaining_to_goal, finish_date, percent_complete = recalculate_progress(
         goal_rub, start_capital, monthly_plan_rub, start_date
     )
-    # показываем только месяцы с вкладом > 0
-    active_labels = [m for m, v in zip(pie_labels, pie_values) if v > 0]
-    active_values = [v for v in pie_values if v > 0]
-
-    fig_pie = px.pie(
-        names=["Начальный капитал"] + active_labels + ["Остаток"],
-        values=[start_capital] + active_values + [remaining_to_goal],
-        title="Выполнено и план по месяцам",
-        hole=0.4
+    # 🔄 Диаграмма прогресса (оставляем только одну — как просил)
+    st.plotly_chart(
+        progress_pie(tuple(pie_labels), tuple(pie_values), start_capital, remaining_to_goal, "Выполнено и план по месяцам"),
+        use_container_width=True,
     )
-    st.plotly_chart(fig_pie, use_container_width=True)
 
     # БЫСТРЫЕ ПОКАЗАТЕЛИ
     c1, c2, c3, c4 = st.columns(4)
@@ -204,85 +268,203 @@ def main():
     c4.metric("Достижение", f"{percent_complete:.2f} %")
     st.caption(f"Оценочная дата завершения: {finish_date.strftime('%d.%m.%Y')}")
 
+    # --- вероятностный прогноз завершения ---
+    render_projection(goal_rub, holdings, table, monthly_plan_rub)
+
+@st.fragment
+@traced_run("upd.py:what_if")
+def what_if_fragment(goal_rub, monthly_plan_rub, start_date, holdings, table, index):
+    # ползунки сетки перезапускают только этот блок
+    render_what_if(goal_rub, monthly_plan_rub, start_date, holdings, table, index)
+
+@st.fragment
+@traced_run("upd.py:monthly_chart")
+def monthly_chart_fragment(index, monthly_plan_rub):
     # --- факт по месяцам: прямо из таблицы, БЕЗ накопления ---
-    fact_by_month = [float(st.session_state.savings_by_month.get(m, 0.0)) for m in month_labels]
-    
+    fact_by_month = st.session_state.savings.series()
     st.markdown("### Факт накоплений по месяцам")
-    fig_lines = go.Figure()
-    
-    fig_lines.add_trace(go.Scatter(
-        x=month_labels,
-        y=fact_by_month,                 # <— без суммирования
-        name="Факт (за месяц)",
-        mode="lines+markers"
-    ))
-    
-    # пунктир — план в месяц 271 634 ₽
-    fig_lines.add_hline(
-        y=271634,
-        line_dash="dot",
-        annotation_text="План в месяц 271 634 ₽",
-        annotation_position="top left"
+    first, last = 0, len(index) - 1
+    if len(index) > 1:
+        # окно просмотра: прорежение считается для него, так что при
+        # сужении окна проступают все точки; меняется — перезапуск только блока
+        first, last = st.select_slider(
+            "Период", options=range(len(index)), value=(first, last),
+            format_func=lambda i: index.labels[i], key=f"fact_window_{len(index)}",
+        )
+    dates = tuple(index.month_starts()[first:last + 1])
+    values = tuple(fact_by_month[first:last + 1].tolist())
+    st.plotly_chart(monthly_fact_line(dates, values, monthly_plan_rub), use_container_width=True)
+
+@st.fragment
+@traced_run("upd.py:table")
+def table_fragment(index, monthly_plan_rub):
+    import pandas as pd
+
+    st.markdown("### Таблица накоплений")
+    df = pd.DataFrame({
+        "Месяц": index.labels,
+        "План (₽)": monthly_plan_rub,
+        "Накоплено (₽)": st.session_state.savings.series(),
+    })
+    st.dataframe(df.style.format({"План (₽)": "{:.2f}", "Накоплено (₽)": "{:.2f}"}), use_container_width=True)
+
+def add_savings(table):
+    """Колбэк формы: срабатывает до перезапуска, поэтому все виды сразу рисуются с новой суммой."""
+    selected_month = st.session_state.add_month  # ключ '2025-07'
+    amounts = [st.session_state.add_rub, st.session_state.add_usd, st.session_state.add_uzs]
+    # всё в целых копейках: пересчёт по курсу ЦБ с учётом Nominal (UZS — за 10 000)
+    added = apply_deposit(
+        st.session_state.writer, st.session_state.savings, table, selected_month, amounts, ("RUB", "USD", "UZS")
     )
-    
-    # шкала как просил
-    fig_lines.update_yaxes(range=[0, 600000], title_text="₽")
-    fig_lines.update_xaxes(title_text="Месяц")
-    
-    st.plotly_chart(fig_lines, use_container_width=True)
+    st.session_state.flash = ("success", f"Добавлено {rub(added):,.2f} ₽ в {month_label(selected_month)}")
+
+def reset_savings():
+    writer = st.session_state.writer
+    st.session_state.savings, ok = apply_reset(writer, st.session_state.savings)
+    if ok:
+        st.session_state.flash = ("success", "Данные сброшены")
+    else:
+        st.session_state.flash = ("error", f"Не удалось сохранить сброс ({writer.store.name}): {writer.last_error}")
+
+def import_history():
+    """Колбэк импорта: файл сворачивается в итоги по месяцам и пишется одной пачкой."""
+    from importer import aggregate, apply_import
+
+    writer = st.session_state.writer
+    try:
+        totals, read, skipped = aggregate(
+            st.session_state.import_file,
+            st.session_state.import_date,
+            st.session_state.import_amount,
+            st.session_state.import_currency or None,
+        )
+    except (KeyError, ValueError) as e:
+        st.session_state.flash = ("error", f"Не удалось разобрать файл: {e}")
+        return
+    savings = st.session_state.savings
+    data, entries = apply_import(savings.to_dict(), totals)
+    st.session_state.savings = Savings.from_dict(savings.index, data)
+    writer.submit(data, entries)
+    if writer.flush():
+        st.session_state.flash = ("success", f"Импортировано строк: {read - skipped} из {read}, месяцев: {totals['month'].nunique()}")
+    else:
+        st.session_state.flash = ("error", f"Не удалось сохранить импорт ({writer.store.name}): {writer.last_error}")
+
+@st.fragment
+@traced_run("upd.py:savings_section")
+def savings_section(goal_rub, start_capital, monthly_plan_rub, start_date, holdings, table, index):
+    progress_fragment(goal_rub, start_capital, monthly_plan_rub, start_date, holdings, table)
+    what_if_fragment(goal_rub, monthly_plan_rub, start_date, holdings, table, index)
+    monthly_chart_fragment(index, monthly_plan_rub)
+
+    # --- стоимость накоплений по курсу ЦБ на каждый день ---
+    render_revaluation(holdings, start_date)
 
     # Сброс
     with st.expander("⚙️ Дополнительно"):
-        if st.button("Сбросить накопления"):
-            st.session_state.savings_by_month = {m: 0 for m in month_labels}
-            save_savings(st.session_state.savings_by_month)
-            st.success("Данные сброшены")
+        st.button("Сбросить накопления", on_click=reset_savings)
+        st.markdown("**Импорт истории из xlsx/csv**")
+        upload = st.file_uploader("Файл", type=["xlsx", "csv"], key="import_file")
+        c1, c2, c3 = st.columns(3)
+        c1.text_input("Колонка даты", "Дата", key="import_date")
+        c2.text_input("Колонка суммы", "Сумма", key="import_amount")
+        c3.text_input("Колонка валюты (пусто — всё в ₽)", "", key="import_currency")
+        st.button("Импортировать", on_click=import_history, disabled=upload is None)
 
     # Добавление накоплений
     st.subheader("Добавить накопления")
     with st.form("add_savings_form"):
         col1, col2, col3, col4 = st.columns(4)
-        input_usd = col1.number_input("USD", min_value=0.0, value=0.0)
-        input_uzs = col2.number_input("UZS", min_value=0.0, value=0.0, step=10000.0)
-        input_rub = col3.number_input("RUB", min_value=0.0, value=0.0, step=1000.0)
-        selected_month = col4.selectbox("Месяц", month_labels)
-        submitted = st.form_submit_button("Добавить")
-    if submitted:
-        usd_dec = Decimal(str(usd))
-        uzs_dec = Decimal(str(uzs))
-        rub_dec = Decimal(str(input_rub))
-        usd_in_rub = Decimal(str(input_usd)) * usd_dec
-        uzs_in_rub = Decimal(str(input_uzs)) * uzs_dec  # uzs = ₽ за 1 сум (как возвращает ЦБ)
-        
-        added_total_dec = rub_dec + usd_in_rub + uzs_in_rub
-        # округлим до копеек, и только потом превратим в float
-        added_total = float(added_total_dec.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-        st.session_state.savings_by_month[selected_month] += added_total
-        save_savings(st.session_state.savings_by_month)
-        st.success(f"Добавлено {added_total:,.2f} ₽ в {selected_month}")
-
-        # Мгновенная перерисовка (пересчитанные значения)
-        pie_labels, pie_values, accumulated, remaining_to_goal, finish_date, percent_complete = recalculate_progress(
-            goal_rub, start_capital, monthly_plan_rub, start_date
-        )
-        active_labels = [m for m, v in zip(pie_labels, pie_values) if v > 0]
-        active_values = [v for v in pie_values if v > 0]
-        fig_pie = px.pie(
-            names=["Начальный капитал"] + active_labels + ["Остаток"],
-            values=[start_capital] + active_values + [remaining_to_goal],
-            title="Выполнено и план по месяцам (обновлено)",
-            hole=0.4
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        col1.number_input("USD", min_value=0.0, max_value=MAX_AMOUNT, value=0.0, key="add_usd")
+        col2.number_input("UZS", min_value=0.0, max_value=MAX_AMOUNT, value=0.0, step=10000.0, key="add_uzs")
+        col3.number_input("RUB", min_value=0.0, max_value=MAX_AMOUNT, value=0.0, step=1000.0, key="add_rub")
+        col4.selectbox("Месяц", index.keys, format_func=month_label, key="add_month")
+        st.form_submit_button("Добавить", on_click=add_savings, args=(table,))
+    if "flash" in st.session_state:
+        kind, text = st.session_state.pop("flash")
+        getattr(st, kind)(text)
+    render_flush_status(st.session_state.writer)
 
-    # Таблица
-    st.markdown("### Таблица накоплений")
-    df = pd.DataFrame({
-        "Месяц": month_labels,
-        "План (₽)": [monthly_plan_rub] * len(month_labels),
-        "Накоплено (₽)": [st.session_state.savings_by_month[m] for m in month_labels]
-    })
-    st.dataframe(df.style.format({"План (₽)": "{:.2f}", "Накоплено (₽)": "{:.2f}"}), use_container_width=True)
+    table_fragment(index, monthly_plan_rub)
+
+# ---------------- Основное приложение ----------------
+def main():
+    st.title("💰 Финансовый дашборд")
+
+    # Ввод исходных данных
+    st.sidebar.header("Ввод исходных данных")
+    goal_rub = st.sidebar.number_input("Итоговая цель (₽)", value=4498000.0)
+    monthly_plan_rub = st.sidebar.number_input("План в месяц (₽)", value=271634.0)
+    start_date = st.sidebar.date_input("Дата начала", value=date(2025, 7, 13))
+    horizon = st.sidebar.number_input("Горизонт (мес.)", min_value=1, max_value=MAX_HORIZON, value=DEFAULT_HORIZON)
+
+    # Курсы и накопления грузим одновременно. Задача чтения таблицы живёт в
+    # сессии: если не дождались её за таймаут, следующий перезапуск
+    # подхватит ту же задачу, а не запустит новую
+    index = MonthIndex(start_date, horizon)
+    rates_job = start(fetch_exchange_rates)
+    if "savings" not in st.session_state and "savings_job" not in st.session_state:
+        st.session_state.savings_job = start(connect_and_load, index)
+
+    try:
+        rates = wait(rates_job, "wait_rates", RATES_TIMEOUT)
+    except FuturesTimeout:
+        rates = (None,) * 5
+    usd, _, uzs, _, _ = rates
+    if usd is None or uzs is None:
+        st.error("Не удалось загрузить курсы валют")
+        return
+
+    # ✅ Верхнее табло с курсами — показывается, пока таблица ещё грузится
+    st.session_state.board_rates = rates
+    rates_board_fragment()
+    st.divider()
+
+    # Портфель в любых валютах ЦБ: курсы всех валют — из той же котировки
+    table = rate_table()
+    holdings = holdings_sidebar(table.codes)
+    by_currency = rub(table.kopecks(list(holdings.values()), list(holdings))).tolist()
+    start_capital = rub(table.value(holdings))
+
+    # Верхний блок с исходными суммами/конвертацией
+    left, right = st.columns(2)
+    with left:
+        st.markdown("#### Исходные накопления")
+        for code, amount in holdings.items():
+            st.write(f"**{code}:** {amount:,.0f}")
+    with right:
+        st.markdown("#### Перевод в рубли")
+        for code, in_rub in zip(holdings, by_currency):
+            st.write(f"Из {code}: {in_rub:,.2f} ₽")
+        st.write(f"**Начальный капитал:** {start_capital:,.2f} ₽")
+
+    if "savings" not in st.session_state:
+        try:
+            with st.spinner("Загружаем накопления…"):
+                savings, writer = wait(st.session_state.savings_job, "wait_sheets", SHEETS_TIMEOUT)
+        except FuturesTimeout:
+            sheets_waiter()
+            return
+        except Exception as e:
+            del st.session_state.savings_job
+            st.error(connect_error_message(e))
+            return
+        del st.session_state.savings_job
+        st.session_state.savings, st.session_state.writer = savings, writer
+    if st.session_state.savings.index != index:
+        # сменили дату начала или горизонт — перекладываем уже загруженное
+        st.session_state.savings = st.session_state.savings.reindex(index)
+    # пополнения других сессий: влитые хранилищем при нашей записи и
+    # записанные с прошлого перезапуска (pull — из общего кэша чтения)
+    st.session_state.writer.pull()
+    for key, kopecks in st.session_state.writer.take_remote().items():
+        st.session_state.savings.add(key, kopecks)
+
+    savings_section(goal_rub, start_capital, monthly_plan_rub, start_date, holdings, table, index)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        finish_trace()
+    render_debug_panel()
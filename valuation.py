@@ -0,0 +1,31 @@
+# ---------------- Переоценка накоплений во времени ----------------
+# Журнал движений по валютам + дневная история курсов -> стоимость портфеля в ₽
+# на каждый день. Всё считается матрично (дни × валюты), без цикла по дням,
+# поэтому многолетний диапазон на тысячи дней пересчитывается мгновенно.
+
+import pandas as pd
+
+BASE_CURRENCY = "RUB"
+
+
+def revalue(ledger, rates, start, end):
+    """
+    Стоимость накоплений в ₽ на каждый день [start, end].
+
+    ledger — DataFrame(date, currency, amount): поступления (и списания со знаком −)
+    rates  — DataFrame(date, currency, rate): ₽ за 1 единицу валюты на дату котировки
+    Возвращает DataFrame: индекс — дни, колонки — валюты, значения — ₽.
+    """
+    days = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq="D")
+
+    # Остатки: движения до start сворачиваем в начальный остаток, затем cumsum по дням
+    flows = ledger.assign(date=pd.to_datetime(ledger["date"]).clip(lower=days[0]))
+    flows = flows.pivot_table(index="date", columns="currency", values="amount", aggfunc="sum")
+    holdings = flows.reindex(days, fill_value=0.0).fillna(0.0).cumsum()
+
+    # Курсы: выходные и праздники закрываем последней известной котировкой
+    prices = rates.pivot_table(index="date", columns="currency", values="rate", aggfunc="last")
+    prices = prices.reindex(prices.index.union(days)).sort_index().ffill().bfill().reindex(days)
+    prices[BASE_CURRENCY] = 1.0
+
+    return holdings * prices.reindex(columns=holdings.columns)